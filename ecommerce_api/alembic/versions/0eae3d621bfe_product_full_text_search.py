@@ -0,0 +1,41 @@
+"""product full-text search
+
+Revision ID: 0eae3d621bfe
+Revises: 8c4ac9fee5ee
+Create Date: 2026-10-18 09:12:40.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from search import FTS_TABLE, create_search_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0eae3d621bfe'
+down_revision: Union[str, Sequence[str], None] = '8c4ac9fee5ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("products"):
+        return
+    # Same IF NOT EXISTS DDL the app runs at startup, so a database the app has
+    # already started against upgrades cleanly
+    create_search_index(bind)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for suffix in ("au", "ad", "ai"):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_search")
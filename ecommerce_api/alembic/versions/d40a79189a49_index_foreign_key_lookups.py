@@ -0,0 +1,71 @@
+"""index foreign key lookups
+
+Revision ID: d40a79189a49
+Revises: 0eae3d621bfe
+Create Date: 2026-10-18 11:02:17.530861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd40a79189a49'
+down_revision: Union[str, Sequence[str], None] = '0eae3d621bfe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns, unique)
+INDEXES = [
+    ("uq_cart_user_product", "cart", ["user_id", "product_id"], True),
+    ("uq_wishlist_user_product", "wishlist", ["user_id", "product_id"], True),
+    ("ix_orders_user_id", "orders", ["user_id"], False),
+    ("ix_reviews_product_id", "reviews", ["product_id"], False),
+]
+
+
+def _merge_duplicate_cart_lines(bind):
+    """Fold duplicate (user_id, product_id) cart lines into the oldest one."""
+    duplicates = bind.execute(sa.text(
+        "SELECT user_id, product_id, MIN(id), SUM(quantity) FROM cart "
+        "GROUP BY user_id, product_id HAVING COUNT(*) > 1"
+    )).fetchall()
+    for user_id, product_id, keep_id, quantity in duplicates:
+        bind.execute(sa.text("UPDATE cart SET quantity = :quantity WHERE id = :id"),
+                     {"quantity": quantity, "id": keep_id})
+        bind.execute(sa.text("DELETE FROM cart WHERE user_id = :user_id AND product_id = :product_id AND id <> :id"),
+                     {"user_id": user_id, "product_id": product_id, "id": keep_id})
+
+
+def _drop_duplicate_wishlist_items(bind):
+    duplicates = bind.execute(sa.text(
+        "SELECT user_id, product_id, MIN(id) FROM wishlist GROUP BY user_id, product_id HAVING COUNT(*) > 1"
+    )).fetchall()
+    for user_id, product_id, keep_id in duplicates:
+        bind.execute(sa.text("DELETE FROM wishlist WHERE user_id = :user_id AND product_id = :product_id AND id <> :id"),
+                     {"user_id": user_id, "product_id": product_id, "id": keep_id})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if inspector.has_table("cart"):
+        _merge_duplicate_cart_lines(bind)
+    if inspector.has_table("wishlist"):
+        _drop_duplicate_wishlist_items(bind)
+    # Tables created by the app's create_all may already carry these indexes
+    for name, table, columns, unique in INDEXES:
+        if inspector.has_table(table) and name not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, unique in reversed(INDEXES):
+        if inspector.has_table(table) and name in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,57 @@
+"""Print SQLite's EXPLAIN QUERY PLAN for the hot foreign-key lookups, without and
+with the indexes added in migration d40a79189a49.
+
+Usage (from ecommerce_api/):
+    python benchmarks/explain_plans.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, select, text
+
+from database import Base
+from models import Cart, Order, Review, Wishlist
+
+NEW_INDEXES = ["uq_cart_user_product", "uq_wishlist_user_product", "ix_orders_user_id", "ix_reviews_product_id"]
+
+QUERIES = {
+    "GET /cart/{user_id}": select(Cart).filter(Cart.user_id == 1),
+    "POST /cart (existing line)": select(Cart).filter(Cart.user_id == 1, Cart.product_id == 2),
+    "GET /wishlist": select(Wishlist).filter(Wishlist.user_id == 1),
+    "orders by user": select(Order).filter(Order.user_id == 1),
+    "reviews by product": select(Review).filter(Review.product_id == 2),
+}
+
+
+def indexes(tables):
+    return [index for table in tables for index in table.indexes if index.name in NEW_INDEXES]
+
+
+def print_plans(engine, label):
+    print(f"\n== {label} ==")
+    with engine.connect() as connection:
+        for route, query in QUERIES.items():
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+            print(f"{route:<28} " + " | ".join(row[-1] for row in plan))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'explain.db')}")
+        Base.metadata.create_all(bind=engine)
+        new_indexes = indexes(Base.metadata.sorted_tables)
+        for index in new_indexes:
+            index.drop(engine)
+        print_plans(engine, "before")
+        for index in new_indexes:
+            index.create(engine)
+        print_plans(engine, "after")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Login throughput and catalog latency under a mixed load, with bcrypt on the
+request threadpool (the old behaviour) versus the password-hashing process pool.
+
+Usage (from ecommerce_api/):
+    python benchmarks/login_benchmark.py --seconds 10 --logins 16 --browsers 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database import Base, async_url
+from dependencies import get_db
+from models import Product, User
+from passwords import PasswordHasher, pwd_context
+
+PASSWORD = "benchmark-password"
+
+
+def use_database(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(username="bench", email="bench@example.com", hashed_password=pwd_context.hash(PASSWORD)))
+    db.add_all([Product(name=f"Product {i}", description="Bench", price=i, stock=10) for i in range(200)])
+    db.commit()
+    db.close()
+    AsyncSessionLocal = async_sessionmaker(create_async_engine(async_url(f"sqlite:///{path}")), expire_on_commit=False)
+
+    async def override_get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    main.app.dependency_overrides[get_db] = override_get_db
+
+
+async def run_mode(label, hasher, seconds, logins, browsers):
+    main.password_hasher = hasher
+    deadline = time.perf_counter() + seconds
+    login_count = 0
+    browse_latencies = []
+
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench") as client:
+        async def login_loop():
+            nonlocal login_count
+            while time.perf_counter() < deadline:
+                response = await client.post("/login", json={"email": "bench@example.com", "password": PASSWORD})
+                if response.status_code == 200:
+                    login_count += 1
+
+        async def browse_loop():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/products?limit=20&sort=price")
+                browse_latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*[login_loop() for _ in range(logins)], *[browse_loop() for _ in range(browsers)])
+
+    hasher.shutdown()
+    p99 = statistics.quantiles(browse_latencies, n=100)[98] if len(browse_latencies) > 1 else float("nan")
+    print(f"{label:<14}{login_count / seconds:>12.1f}{len(browse_latencies) / seconds:>14.1f}"
+          f"{statistics.median(browse_latencies):>12.2f}{p99:>12.2f}")
+
+
+async def run(seconds, logins, browsers):
+    print(f"{'mode':<14}{'logins/s':>12}{'browse req/s':>14}{'p50 ms':>12}{'p99 ms':>12}")
+    await run_mode("threadpool", PasswordHasher(workers=0), seconds, logins, browsers)
+    await run_mode("process pool", PasswordHasher(), seconds, logins, browsers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--logins", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--browsers", type=int, default=16, help="concurrent GET /products clients")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        use_database(os.path.join(tmp, "bench.db"))
+        asyncio.run(run(args.seconds, args.logins, args.browsers))
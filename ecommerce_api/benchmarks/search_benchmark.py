@@ -0,0 +1,102 @@
+"""Compare the old ILIKE product search with the full-text index.
+
+Usage (from ecommerce_api/):
+    python benchmarks/search_benchmark.py                 # 100k and 1M products
+    python benchmarks/search_benchmark.py --sizes 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import crud
+from database import Base, async_url
+from models import Product
+from search import create_search_index
+
+TERMS = ["lamp", "ste", "velvet chair", "zzqx"]  # common word, prefix, two words, no match
+REPEAT = 5
+
+
+def make_vocabulary(rng, size=5000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)}
+    return sorted(words) + ["lamp", "steel", "stool", "velvet", "chair"]
+
+
+def populate(engine, count, rng):
+    vocabulary = make_vocabulary(rng)
+    batch = []
+    with engine.begin() as connection:
+        raw = connection.connection.driver_connection
+        for i in range(count):
+            name = " ".join(rng.choices(vocabulary, k=3))
+            description = " ".join(rng.choices(vocabulary, k=12))
+            batch.append((name, description, rng.randint(1, 100000), rng.randint(0, 50)))
+            if len(batch) == 50000:
+                raw.executemany("INSERT INTO products (name, description, price, stock) VALUES (?, ?, ?, ?)", batch)
+                batch.clear()
+        if batch:
+            raw.executemany("INSERT INTO products (name, description, price, stock) VALUES (?, ?, ?, ?)", batch)
+
+
+async def ilike_search(db, term):
+    pattern = f"%{term}%"
+    query = select(Product).filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+    result = await db.execute(query.order_by(Product.id).limit(crud.DEFAULT_PAGE_SIZE))
+    return result.scalars().all()
+
+
+async def fts_search(db, term):
+    return (await crud.get_products(db, search=term))[0]
+
+
+async def timed(fn, db, term):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await fn(db, term)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def compare(url):
+    engine = create_async_engine(async_url(url))
+    async with AsyncSession(engine) as db:
+        for term in TERMS:
+            old = await timed(ilike_search, db, term)
+            new = await timed(fts_search, db, term)
+            print(f"{term:<14}{old:>12.2f}{new:>12.2f}{old / new:>9.1f}x")
+    await engine.dispose()
+
+
+def run(count):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        populate(engine, count, random.Random(42))
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            create_search_index(connection)
+        print(f"\n{count:,} products (index build {time.perf_counter() - start:.1f}s)")
+        print(f"{'term':<14}{'ilike ms':>12}{'fts ms':>12}{'speedup':>10}")
+
+        asyncio.run(compare(url))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size)
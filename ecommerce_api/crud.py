@@ -1,17 +1,28 @@
-from sqlalchemy.orm import Session
+import base64
+import json
+import math
+
+from sqlalchemy import delete, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User, Product, Cart, Wishlist, Order, Review, Coupon
-from schemas import UserCreate, ProductCreate, CartItemCreate, ReviewCreate
-from passlib.context import CryptContext
+from schemas import UserCreate, ProductCreate, ProductOut, CartItemCreate, ReviewCreate
+from search import ranked_matches, supports_fts, tokenize
+from cache import TTLCache
+from passwords import password_hasher
 from fastapi import HTTPException
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Read-through caches for the catalog. Entries are plain dicts (never ORM objects)
+# so they can be shared across sessions and threads.
+product_cache = TTLCache(maxsize=10000, ttl=60)  # product id -> ProductOut dict
+product_page_cache = TTLCache(maxsize=1024, ttl=30)  # normalized listing params -> (ids, next_cursor)
 
 
 # ----- User CRUD -----
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate):
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -19,83 +30,312 @@ def create_user(db: Session, user: UserCreate):
         is_admin=False
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    result = await db.execute(select(User).filter(User.email == email))
+    user = result.scalars().first()
+    if not user:
+        return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
 # ----- Product CRUD -----
 
-def create_product(db: Session, product: ProductCreate):
+async def create_product(db: AsyncSession, product: ProductCreate):
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await db.refresh(db_product)
+    # A new product can land on any cached listing page
+    product_page_cache.clear()
     return db_product
 
 
-def get_products(db: Session, search: str = None, min_price: int = 0, max_price: int = 100000):
-    query = db.query(Product)
-    if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+STREAM_CHUNK_SIZE = 500
+
+# Keyset columns per sort order; "id" is always last so the order is total
+SORT_KEYS = {"id": ("id",), "price": ("price", "id"), "relevance": ("score", "id")}
+MIN_INT64, MAX_INT64 = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(key: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def _key_value(name: str, value):
+    # Cursors come back from clients: keep them to what the columns can hold
+    if name == "score":
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(value)
+        return value
+    value = int(value)
+    if not MIN_INT64 <= value <= MAX_INT64:
+        raise ValueError(value)
+    return value
+
+
+def decode_cursor(cursor: str, sort: str = "id") -> dict:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {name: _key_value(name, key[name]) for name in SORT_KEYS[sort]}
+    except (ValueError, KeyError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _resolve_sort(db: AsyncSession, search: str = None, sort: str = None) -> str:
+    # Relevance only exists when the full-text index is doing the matching
+    ranked = bool(search) and supports_fts(db.bind.dialect.name) and bool(tokenize(search))
+    if sort is None:
+        return "relevance" if ranked else "id"
+    if sort == "relevance" and not ranked:
+        return "id"
+    return sort
+
+
+def _product_page_query(db: AsyncSession, search: str = None, min_price: int = 0, max_price: int = 100000,
+                        sort: str = "id", after: dict = None):
+    """Products ordered by the keyset of `sort`; rows are (Product, *key columns)."""
+    dialect = db.bind.dialect.name
+    columns = {"id": Product.id, "price": Product.price}
+    query = select(Product)
+    if search and supports_fts(dialect) and tokenize(search):
+        matches = ranked_matches(search, dialect)
+        query = query.join(matches, matches.c.id == Product.id)
+        columns["score"] = matches.c.score
+    elif search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
     query = query.filter(Product.price.between(min_price, max_price))
-    return query.all()
+
+    keys = [columns[name] for name in SORT_KEYS[sort]]
+    if after:
+        query = query.filter(tuple_(*keys) > tuple_(*[after[name] for name in SORT_KEYS[sort]]))
+    return query.add_columns(*keys).order_by(*keys)
+
+
+def _row_key(row, sort: str) -> dict:
+    return dict(zip(SORT_KEYS[sort], row[1:]))
+
+
+async def get_products(db: AsyncSession, search: str = None, min_price: int = 0, max_price: int = 100000,
+                 sort: str = None, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Return one keyset page of products and the cursor for the next one.
+
+    Searches go through the full-text index and default to relevance order.
+    """
+    sort = _resolve_sort(db, search, sort)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, sort) if cursor else None
+    # Fetch one extra row to know whether another page exists without a COUNT(*)
+    result = await db.execute(_product_page_query(db, search, min_price, max_price, sort, after).limit(limit + 1))
+    rows = result.all()
+    next_cursor = encode_cursor(_row_key(rows[limit - 1], sort)) if len(rows) > limit else None
+    return [row[0] for row in rows[:limit]], next_cursor
+
+
+async def iter_products(db: AsyncSession, search: str = None, min_price: int = 0, max_price: int = 100000,
+                  sort: str = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield every matching product, walking the keyset in chunks so memory stays flat."""
+    sort = _resolve_sort(db, search, sort)
+    after = None
+    while True:
+        result = await db.execute(_product_page_query(db, search, min_price, max_price, sort, after).limit(chunk_size))
+        rows = result.all()
+        for row in rows:
+            yield row[0]
+        if len(rows) < chunk_size:
+            return
+        after = _row_key(rows[-1], sort)
+        # Drop the chunk from the identity map before fetching the next one
+        db.expunge_all()
+
+
+def _snapshot(product: Product) -> dict:
+    return ProductOut.from_orm(product).dict()
+
+
+async def get_cached_products(db: AsyncSession, product_ids: list) -> list:
+    """Product dicts for `product_ids`, in order; cache misses are filled with one IN query."""
+    found = {}
+    for product_id in product_ids:
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            found[product_id] = cached
+    missing = [product_id for product_id in product_ids if product_id not in found]
+    if missing:
+        result = await db.execute(select(Product).filter(Product.id.in_(missing)))
+        for product in result.scalars():
+            found[product.id] = _snapshot(product)
+            product_cache.set(product.id, found[product.id])
+    return [found[product_id] for product_id in product_ids if product_id in found]
+
+
+async def get_cached_product(db: AsyncSession, product_id: int):
+    products = await get_cached_products(db, [product_id])
+    return products[0] if products else None
+
+
+async def get_products_cached(db: AsyncSession, search: str = None, min_price: int = 0, max_price: int = 100000,
+                        sort: str = None, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Cached get_products: pages remember only product ids, so a stock change
+    invalidates one product entry rather than every page it appears on."""
+    normalized = " ".join(search.lower().split()) if search else None
+    key = (normalized, min_price, max_price, sort, cursor, min(limit, MAX_PAGE_SIZE))
+    page = product_page_cache.get(key)
+    if page is None:
+        items, next_cursor = await get_products(db, search, min_price, max_price, sort, cursor, limit)
+        snapshots = [_snapshot(product) for product in items]
+        for snapshot in snapshots:
+            product_cache.set(snapshot["id"], snapshot)
+        product_page_cache.set(key, ([snapshot["id"] for snapshot in snapshots], next_cursor))
+        return snapshots, next_cursor
+    product_ids, next_cursor = page
+    return await get_cached_products(db, product_ids), next_cursor
+
+
+def invalidate_products(product_ids):
+    for product_id in product_ids:
+        product_cache.delete(product_id)
+
+
+def cache_stats() -> dict:
+    return {"products": product_cache.stats(), "product_pages": product_page_cache.stats()}
 
 
 # ----- Cart CRUD -----
 
-def add_to_cart(db: Session, user_id: int, item: CartItemCreate):
-    product = db.query(Product).filter(Product.id == item.product_id).first()
-    if not product or product.stock < item.quantity:
+async def add_to_cart(db: AsyncSession, user_id: int, item: CartItemCreate):
+    # Cached stock is good enough here: place_order re-checks it against the database
+    product = await get_cached_product(db, item.product_id)
+    if not product or product["stock"] < item.quantity:
         raise HTTPException(status_code=400, detail="Invalid or insufficient stock")
 
-    cart_item = db.query(Cart).filter(Cart.user_id == user_id, Cart.product_id == item.product_id).first()
+    result = await db.execute(select(Cart).filter(Cart.user_id == user_id, Cart.product_id == item.product_id))
+    cart_item = result.scalars().first()
     if cart_item:
         cart_item.quantity += item.quantity
     else:
         cart_item = Cart(user_id=user_id, **item.dict())
         db.add(cart_item)
-    db.commit()
+    await db.commit()
     return cart_item
 
 
-def get_cart(db: Session, user_id: int):
-    return db.query(Cart).filter(Cart.user_id == user_id).all()
+async def get_cart(db: AsyncSession, user_id: int):
+    result = await db.execute(select(Cart).filter(Cart.user_id == user_id))
+    return result.scalars().all()
 
 
 # ----- Wishlist CRUD -----
 
-def add_to_wishlist(db: Session, user_id: int, product_id: int):
+async def add_to_wishlist(db: AsyncSession, user_id: int, product_id: int):
+    if await get_cached_product(db, product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
     wishlist_item = Wishlist(user_id=user_id, product_id=product_id)
     db.add(wishlist_item)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        result = await db.execute(select(Wishlist).filter_by(user_id=user_id, product_id=product_id))
+        wishlist_item = result.scalars().first()
+        if wishlist_item is None:
+            # Not uq_wishlist_user_product (e.g. the product deleted meanwhile)
+            raise
     return wishlist_item
 
 
-def get_wishlist(db: Session, user_id: int):
-    return db.query(Wishlist).filter(Wishlist.user_id == user_id).all()
+async def get_wishlist(db: AsyncSession, user_id: int):
+    result = await db.execute(select(Wishlist).filter(Wishlist.user_id == user_id))
+    return result.scalars().all()
+
+
+# ----- Order CRUD -----
+
+async def place_order(db: AsyncSession, user_id: int):
+    """Turn the user's cart into orders in a single transaction.
+
+    Products are loaded with one IN query (row-locked on databases that support
+    FOR UPDATE) and stock is taken with a conditional UPDATE, so two concurrent
+    checkouts can never both claim the last unit. Any failure rolls back the
+    whole cart.
+    """
+    result = await db.execute(select(Cart).filter(Cart.user_id == user_id))
+    cart_items = result.scalars().all()
+    if not cart_items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+
+    quantities = {}
+    for item in cart_items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    try:
+        result = await db.execute(
+            select(Product)
+            .filter(Product.id.in_(list(quantities)))
+            .order_by(Product.id)
+            .with_for_update()
+        )
+        products = {product.id: product for product in result.scalars()}
+        for product_id, quantity in sorted(quantities.items()):
+            product = products.get(product_id)
+            if product is None:
+                raise HTTPException(status_code=400, detail=f"Product {product_id} is no longer available")
+            result = await db.execute(
+                update(Product)
+                .where(Product.id == product_id, Product.stock >= quantity)
+                .values(stock=Product.stock - quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise HTTPException(status_code=400, detail=f"Insufficient stock for {product.name}")
+
+        orders = [
+            {"user_id": user_id, "product_id": item.product_id, "quantity": item.quantity,
+             "total_price": products[item.product_id].price * item.quantity}
+            for item in cart_items
+        ]
+        await db.execute(insert(Order), orders)
+        await db.execute(
+            delete(Cart)
+            .where(Cart.id.in_([item.id for item in cart_items]))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    invalidate_products(quantities)
+    return orders
 
 
 # ----- Review CRUD -----
 
-def create_review(db: Session, user_id: int, review: ReviewCreate):
+async def create_review(db: AsyncSession, user_id: int, review: ReviewCreate):
     db_review = Review(user_id=user_id, **review.dict())
     db.add(db_review)
-    db.commit()
+    await db.commit()
     return db_review
 
 
 # ----- Coupon CRUD -----
 
-def apply_coupon(db: Session, code: str):
-    coupon = db.query(Coupon).filter(Coupon.code == code, Coupon.is_active == True).first()
+async def apply_coupon(db: AsyncSession, code: str):
+    result = await db.execute(select(Coupon).filter(Coupon.code == code, Coupon.is_active == True))
+    coupon = result.scalars().first()
     if not coupon:
         raise HTTPException(status_code=400, detail="Invalid or expired coupon")
     return coupon
@@ -1,25 +1,38 @@
 # dependencies.py
+import time
+from dataclasses import dataclass
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from database import get_db
 from models import User
+from cache import TTLCache
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 
+# Authenticated users are cached by token subject so protected routes skip the
+# users lookup. Entries never outlive the token that loaded them.
+PRINCIPAL_CACHE_TTL = 300
+principal_cache = TTLCache(maxsize=10000, ttl=PRINCIPAL_CACHE_TTL)
+
 # 👇 For Swagger to read the "Authorize" token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+@dataclass(frozen=True)
+class Principal:
+    """The caller as described by the token's claims; no database row behind it."""
+    id: int
+    username: str
+    is_admin: bool = False
+
+
+def decode_token(token: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
@@ -27,13 +40,58 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+
+def invalidate_user(username: str):
+    principal_cache.delete(username)
+
 
-    user = db.query(User).filter(User.username == username).first()
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.username)
+    # A rename must also drop the entry cached under the old subject
+    for old_username in inspect(target).attrs.username.history.deleted:
+        invalidate_user(old_username)
+
+
+async def _load_user(payload: dict, db: AsyncSession) -> User:
+    username = payload["sub"]
+    cached = principal_cache.get(username)
+    if cached is not None:
+        # Rebuild the row from the cache and attach it without a SELECT
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    result = await db.execute(select(User).filter(User.username == username))
+    user = result.scalars().first()
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    ttl = min(PRINCIPAL_CACHE_TTL, payload["exp"] - time.time()) if "exp" in payload else PRINCIPAL_CACHE_TTL
+    if ttl > 0:
+        principal_cache.set(username, {c.key: getattr(user, c.key) for c in User.__table__.columns}, ttl=ttl)
     return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+    return await _load_user(decode_token(token), db)
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    """For routes that only need the caller's id/role: answered from the token's
+    claims when present, otherwise from the principal cache."""
+    payload = decode_token(token)
+    if "user_id" in payload:
+        return Principal(id=payload["user_id"], username=payload["sub"], is_admin=payload.get("is_admin", False))
+    user = await _load_user(payload, db)
+    return Principal(id=user.id, username=user.username, is_admin=bool(user.is_admin))
@@ -0,0 +1,10 @@
+# Per-request SQL instrumentation lives in shared/instrumentation.py at the repository root, one copy for
+# every app; this puts the root on the path and re-exports it.
+import os
+import sys
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+    sys.path.append(_root)
+
+from shared.instrumentation import *  # noqa: E402,F401,F403
@@ -1,33 +1,49 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from models import User, Product, Cart, Wishlist, Order, Review, Coupon
-from database import Base, engine
-from schemas import UserCreate, UserLogin, Token, ProductCreate, CartItemCreate, ReviewCreate
-from dependencies import get_current_user, get_db
+from database import Base, engine, async_engine, open_session
+from instrumentation import SQLInstrumentationMiddleware
+from search import create_search_index
+from schemas import UserCreate, UserLogin, Token, ProductCreate, ProductOut, ProductPage, CartItemCreate, ReviewCreate
+from dependencies import Principal, get_current_principal, get_db
+import crud
+from passwords import password_hasher
 
-from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
 from fastapi.openapi.utils import get_openapi
 
 # App init and DB setup
 app = FastAPI(title="E-commerce API")
+app.add_middleware(SQLInstrumentationMiddleware)
 Base.metadata.create_all(bind=engine)
+with engine.begin() as connection:
+    create_search_index(connection)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@app.on_event("shutdown")
+async def shutdown():
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
 # JWT constants
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Put user_id/is_admin claims in issued tokens so routes that only need the
+# caller's id never touch the users table. A role change then applies from the
+# user's next token.
+TOKEN_USER_CLAIMS = True
 
 # ------------------ Utility Functions ------------------
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
+def create_access_token(data: dict, expires_delta: timedelta = None, user: User = None):
     to_encode = data.copy()
+    if user is not None and TOKEN_USER_CLAIMS:
+        to_encode.update({"user_id": user.id, "is_admin": bool(user.is_admin)})
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -35,8 +51,8 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 # ------------------ Authentication Routes ------------------
 
 @app.post("/signup")
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    hashed_password = pwd_context.hash(user.password)
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -44,106 +60,118 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
         is_admin=True  # 👈 TEMP: for dev/testing only
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return {"message": "User registered successfully"}
 
 
 @app.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter(User.email == user.email))
+    db_user = result.scalars().first()
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token(data={"sub": db_user.username})
+    valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    token = create_access_token(data={"sub": db_user.username}, user=db_user)
+    if new_hash:
+        # Stored hash uses outdated settings: replace it now that we know the password
+        db_user.hashed_password = new_hash
+        await db.commit()
     return {"access_token": token, "token_type": "bearer"}
 
 # ------------------ Product Routes ------------------
 
-@app.get("/products")
-def get_products(search: str = None, min_price: int = 0, max_price: int = 100000, db: Session = Depends(get_db)):
-    query = db.query(Product)
-    if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
-    query = query.filter(Product.price.between(min_price, max_price))
-    return query.all()
+@app.get("/products", response_model=ProductPage)
+async def get_products(
+    search: str = None,
+    min_price: int = 0,
+    max_price: int = 100000,
+    sort: str = Query(None, regex="^(id|price|relevance)$"),
+    cursor: str = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    if stream:
+        # NDJSON: one product per line, written as the chunks come back from the DB
+        async def lines():
+            # Own session: the stream outlives the request's dependencies
+            async with open_session() as session:
+                async for product in crud.iter_products(session, search, min_price, max_price, sort):
+                    yield ProductOut.from_orm(product).json() + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    items, next_cursor = await crud.get_products_cached(db, search, min_price, max_price, sort, cursor, limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @app.post("/products")
-def add_product(product: ProductCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def add_product(product: ProductCreate, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Permission denied")
-    db_product = Product(**product.dict())
-    db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    return db_product
+    return await crud.create_product(db, product)
+
+@app.get("/products/cache-stats")
+async def get_product_cache_stats():
+    return crud.cache_stats()
 
 # ------------------ Cart Routes ------------------
 
 @app.post("/cart")
-def add_to_cart(cart_item: CartItemCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == cart_item.product_id).first()
-    if not product or product.stock < cart_item.quantity:
+async def add_to_cart(cart_item: CartItemCreate, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    # Cached stock is good enough here: checkout re-checks it against the database
+    product = await crud.get_cached_product(db, cart_item.product_id)
+    if not product or product["stock"] < cart_item.quantity:
         raise HTTPException(status_code=400, detail="Insufficient stock")
 
-    existing_item = db.query(Cart).filter(Cart.user_id == user.id, Cart.product_id == cart_item.product_id).first()
+    result = await db.execute(select(Cart).filter(Cart.user_id == user.id, Cart.product_id == cart_item.product_id))
+    existing_item = result.scalars().first()
     if existing_item:
         existing_item.quantity += cart_item.quantity
     else:
         db_item = Cart(user_id=user.id, **cart_item.dict())
         db.add(db_item)
-    db.commit()
+    await db.commit()
     return {"message": "Cart updated"}
 
 @app.get("/cart/{user_id}")
-def get_cart(user_id: int, db: Session = Depends(get_db)):
-    return db.query(Cart).filter(Cart.user_id == user_id).all()
+async def get_cart(user_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Cart).filter(Cart.user_id == user_id))
+    return result.scalars().all()
 
 # ------------------ Wishlist Routes ------------------
 
 @app.post("/wishlist")
-def add_to_wishlist(product_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_item = Wishlist(user_id=user.id, product_id=product_id)
-    db.add(db_item)
-    db.commit()
+async def add_to_wishlist(product_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    await crud.add_to_wishlist(db, user.id, product_id)
     return {"message": "Added to wishlist"}
 
 @app.get("/wishlist")
-def get_wishlist(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Wishlist).filter(Wishlist.user_id == user.id).all()
+async def get_wishlist(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Wishlist).filter(Wishlist.user_id == user.id))
+    return result.scalars().all()
 
 # ------------------ Orders ------------------
 
 @app.post("/orders")
-def create_order(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    cart_items = db.query(Cart).filter(Cart.user_id == user.id).all()
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    for item in cart_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product.stock < item.quantity:
-            raise HTTPException(status_code=400, detail=f"Insufficient stock for {product.name}")
-        product.stock -= item.quantity
-        db_order = Order(user_id=user.id, product_id=product.id, quantity=item.quantity, total_price=product.price * item.quantity)
-        db.add(db_order)
-        db.delete(item)
-    db.commit()
+async def create_order(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    await crud.place_order(db, user.id)
     return {"message": "Order placed successfully"}
 
 # ------------------ Reviews ------------------
 
 @app.post("/reviews")
-def add_review(review: ReviewCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def add_review(review: ReviewCreate, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     db_review = Review(user_id=user.id, **review.dict())
     db.add(db_review)
-    db.commit()
+    await db.commit()
     return {"message": "Review added successfully"}
 
 # ------------------ Coupons ------------------
 
 @app.post("/apply-coupon")
-def apply_coupon(code: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    coupon = db.query(Coupon).filter(Coupon.code == code, Coupon.is_active == True).first()
+async def apply_coupon(code: str, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Coupon).filter(Coupon.code == code, Coupon.is_active == True))
+    coupon = result.scalars().first()
     if not coupon:
         raise HTTPException(status_code=400, detail="Invalid or expired coupon")
     return {"message": f"Coupon applied. {coupon.discount_percentage}% discount available"}
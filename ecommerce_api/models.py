@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -32,6 +32,9 @@ class Cart(Base):
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer)
 
+    # One line per product in a cart; also serves get_cart's user_id lookup
+    __table_args__ = (Index("uq_cart_user_product", "user_id", "product_id", unique=True),)
+
 # Wishlist Model
 class Wishlist(Base):
     __tablename__ = "wishlist"
@@ -40,12 +43,14 @@ class Wishlist(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     product_id = Column(Integer, ForeignKey("products.id"))
 
+    __table_args__ = (Index("uq_wishlist_user_product", "user_id", "product_id", unique=True),)
+
 # Order Model
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer)
     total_price = Column(Integer)
@@ -56,7 +61,7 @@ class Review(Base):
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     rating = Column(Integer)
     review_text = Column(String)
 
@@ -0,0 +1,10 @@
+# Password hashing in a process pool lives in shared/passwords.py at the repository root, one copy for
+# every app; this puts the root on the path and re-exports it.
+import os
+import sys
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+    sys.path.append(_root)
+
+from shared.passwords import *  # noqa: E402,F401,F403
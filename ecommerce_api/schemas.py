@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 
 # ----- User Schemas -----
@@ -50,6 +50,11 @@ class ProductOut(BaseModel):
         orm_mode = True
 
 
+class ProductPage(BaseModel):
+    items: List[ProductOut]
+    next_cursor: Optional[str] = None
+
+
 # ----- Cart Schemas -----
 
 class CartItemCreate(BaseModel):
@@ -0,0 +1,87 @@
+import re
+
+from sqlalchemy import Float, Integer, inspect, text
+
+# Full-text product search.
+#
+# SQLite: an external-content FTS5 table over products(name, description), kept in
+# sync by triggers, ranked with bm25 (name weighted above description).
+# PostgreSQL: a GIN index on a weighted tsvector expression, ranked with ts_rank.
+# Any other dialect falls back to ILIKE over name and description.
+
+FTS_TABLE = "products_fts"
+SEARCH_DIALECTS = ("sqlite", "postgresql")
+
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, content='products', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+PG_DDL = [f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING GIN (({PG_VECTOR}))"]
+
+
+def supports_fts(dialect_name: str) -> bool:
+    return dialect_name in SEARCH_DIALECTS
+
+
+def create_search_index(connection):
+    """Create the search index and its sync triggers if missing (idempotent)."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        is_new = not inspect(connection).has_table(FTS_TABLE)
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        if is_new:
+            # Index the rows that were already in products before the table existed
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for statement in PG_DDL:
+            connection.execute(text(statement))
+
+
+def tokenize(term: str):
+    return re.findall(r"\w+", term.lower())
+
+
+def match_expression(term: str, dialect_name: str):
+    """Turn free text into a prefix-matching query: every word must match the start of a token."""
+    tokens = tokenize(term)
+    if not tokens:
+        return None
+    if dialect_name == "postgresql":
+        return " & ".join(f"{token}:*" for token in tokens)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def ranked_matches(term: str, dialect_name: str):
+    """Subquery of (id, score) for products matching `term`; lower score ranks higher."""
+    expression = match_expression(term, dialect_name)
+    if dialect_name == "postgresql":
+        sql = (
+            f"SELECT id, -ts_rank({PG_VECTOR}, to_tsquery('simple', :match)) AS score "
+            f"FROM products WHERE ({PG_VECTOR}) @@ to_tsquery('simple', :match)"
+        )
+    else:
+        sql = (
+            f"SELECT rowid AS id, bm25({FTS_TABLE}, 10.0, 1.0) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        )
+    return text(sql).bindparams(match=expression).columns(id=Integer, score=Float).subquery("matches")
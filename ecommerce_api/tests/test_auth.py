@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+
+from fastapi.testclient import TestClient
+from jose import jwt
+from passlib.hash import bcrypt
+from main import app, create_access_token, SECRET_KEY, ALGORITHM
+from database import SessionLocal
+from dependencies import principal_cache
+from models import User
+from passwords import PasswordHasher
+
+client = TestClient(app)
+
+
+def create_user():
+    db = SessionLocal()
+    user = User(username=uuid.uuid4().hex, email=f"{uuid.uuid4().hex}@example.com", hashed_password="x", is_admin=True)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+def test_token_claims_carry_user_id_and_role():
+    user = create_user()
+    payload = jwt.decode(create_access_token({"sub": user.username}, user=user), SECRET_KEY, algorithms=[ALGORITHM])
+    assert payload["user_id"] == user.id
+    assert payload["is_admin"] is True
+
+
+def test_principal_cache_hit_and_invalidation_on_user_change():
+    user = create_user()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+    assert client.get("/wishlist", headers=headers).status_code == 200
+    assert principal_cache.get(user.username)["id"] == user.id
+    hits = principal_cache.hits
+    assert client.get("/wishlist", headers=headers).status_code == 200
+    assert principal_cache.hits == hits + 1
+
+    db = SessionLocal()
+    db.query(User).get(user.id).is_admin = False
+    db.commit()
+    db.close()
+    assert principal_cache.get(user.username) is None
+
+
+def test_login_upgrades_legacy_password_hash():
+    db = SessionLocal()
+    name = uuid.uuid4().hex
+    db.add(User(username=name, email=f"{name}@example.com", hashed_password=bcrypt.using(rounds=4).hash("legacypass")))
+    db.commit()
+
+    response = client.post("/login", json={"email": f"{name}@example.com", "password": "legacypass"})
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.query(User).filter(User.username == name).first().hashed_password.startswith("$2b$12$")
+    db.close()
+
+
+def test_password_hasher_recovers_from_a_dead_worker():
+    hasher = PasswordHasher(workers=1)
+
+    async def hash_after_worker_dies():
+        hashed = await hasher.hash("first")
+        for process in list(hasher._pool._processes.values()):
+            process.kill()
+            process.join()
+        return hashed, await hasher.verify_and_update("first", hashed)
+
+    try:
+        hashed, (valid, _) = asyncio.run(hash_after_worker_dies())
+    finally:
+        hasher.shutdown()
+    assert valid and bcrypt.identify(hashed)
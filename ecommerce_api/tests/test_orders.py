@@ -1,6 +1,13 @@
+import asyncio
+import uuid
+
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from main import app
+from database import SessionLocal, AsyncSessionLocal, async_engine
+from models import User, Product, Cart, Order
+import crud
 
 client = TestClient(app)
 
@@ -12,3 +19,47 @@ def test_get_cart_for_nonexistent_user():
     response = client.get("/cart/999")
     assert response.status_code == 200
     assert response.json() == []
+
+
+def test_concurrent_checkouts_never_oversell():
+    stock, shoppers = 5, 200
+    db = SessionLocal()
+    product = Product(name=f"Limited {uuid.uuid4().hex[:8]}", description="Low stock", price=10, stock=stock)
+    users = [User(username=uuid.uuid4().hex, email=f"{uuid.uuid4().hex}@example.com", hashed_password="x")
+             for _ in range(shoppers)]
+    db.add(product)
+    db.add_all(users)
+    db.flush()
+    db.add_all([Cart(user_id=user.id, product_id=product.id, quantity=1) for user in users])
+    db.commit()
+    user_ids, product_id = [user.id for user in users], product.id
+    db.close()
+
+    async def checkout(user_id):
+        async with AsyncSessionLocal() as session:
+            try:
+                await crud.place_order(session, user_id)
+                return True
+            except HTTPException:
+                return False
+
+    async def checkout_all():
+        results = await asyncio.gather(*[checkout(user_id) for user_id in user_ids])
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(checkout_all())
+
+    db = SessionLocal()
+    assert results.count(True) == stock
+    assert db.query(Product).get(product_id).stock == 0
+    assert db.query(Order).filter(Order.product_id == product_id).count() == stock
+    # Shoppers who missed out keep their cart line
+    assert db.query(Cart).filter(Cart.product_id == product_id).count() == shoppers - stock
+
+    db.query(Order).filter(Order.product_id == product_id).delete()
+    db.query(Cart).filter(Cart.product_id == product_id).delete()
+    db.query(User).filter(User.id.in_(user_ids)).delete()
+    db.query(Product).filter(Product.id == product_id).delete()
+    db.commit()
+    db.close()
@@ -1,13 +1,20 @@
+import asyncio
+import base64
+import json
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+from database import SessionLocal, ThreadedSession
+import crud
 
 client = TestClient(app)
 
 def test_get_products_empty():
     response = client.get("/products")
     assert response.status_code == 200
-    assert response.json() == []
+    assert response.json() == {"items": [], "next_cursor": None}
 
 def test_add_product_unauthorized():
     product_data = {
@@ -18,3 +25,117 @@ def test_add_product_unauthorized():
     }
     response = client.post("/products", json=product_data)
     assert response.status_code in [401, 403]
+
+
+def get_admin_token():
+    name = uuid.uuid4().hex[:12]
+    client.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": "adminpass"})
+    response = client.post("/login", json={"email": f"{name}@example.com", "password": "adminpass"})
+    return response.json()["access_token"]
+
+
+def test_get_products_keyset_pagination():
+    token = get_admin_token()
+    tag = uuid.uuid4().hex[:12]
+    for price in (30, 10, 20):
+        client.post(
+            "/products",
+            json={"name": f"{tag} item {price}", "description": "Paged", "price": price, "stock": 5},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    first = client.get(f"/products?search={tag}&sort=price&limit=2").json()
+    assert [p["price"] for p in first["items"]] == [10, 20]
+    assert first["next_cursor"]
+
+    second = client.get(f"/products?search={tag}&sort=price&limit=2&cursor={first['next_cursor']}").json()
+    assert [p["price"] for p in second["items"]] == [30]
+    assert second["next_cursor"] is None
+
+    response = client.get(f"/products?search={tag}&stream=true")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert len([json.loads(line) for line in response.text.splitlines()]) == 3
+
+
+def test_get_products_rejects_bad_cursor_and_oversized_page():
+    assert client.get("/products?cursor=not-a-cursor").status_code == 400
+    assert client.get("/products?limit=1000").status_code == 422
+
+
+@pytest.mark.parametrize("key", ['{"id": 1e999}', '{"id": 1000000000000000000000000000000}', '{"id": [1]}'])
+def test_get_products_rejects_tampered_cursor(key):
+    cursor = base64.urlsafe_b64encode(key.encode()).decode()
+    assert client.get(f"/products?cursor={cursor}").status_code == 400
+    relevance = base64.urlsafe_b64encode(b'{"score": NaN, "id": 1}').decode()
+    assert client.get(f"/products?search=widget&sort=relevance&cursor={relevance}").status_code == 400
+
+
+def test_search_products_ranks_name_and_description_with_prefix():
+    token = get_admin_token()
+    tag = uuid.uuid4().hex[:12]
+    for name, description in [
+        (f"Plain {tag}", f"A widgetizer accessory for {tag}"),
+        (f"Widgetizer {tag}", "The original"),
+        (f"Gadget {tag}", "Unrelated"),
+    ]:
+        client.post(
+            "/products",
+            json={"name": name, "description": description, "price": 50, "stock": 1},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    results = client.get(f"/products?search=widget {tag}").json()["items"]
+    # Prefix match on "widget", name hits rank above description-only hits
+    assert [p["name"] for p in results] == [f"Widgetizer {tag}", f"Plain {tag}"]
+
+
+def test_product_cache_serves_hits_and_invalidates_on_checkout():
+    token = get_admin_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    tag = uuid.uuid4().hex[:12]
+    product = client.post(
+        "/products",
+        json={"name": f"Cached {tag}", "description": "Cache me", "price": 5, "stock": 5},
+        headers=headers,
+    ).json()
+
+    assert client.get(f"/products?search={tag}").json()["items"][0]["stock"] == 5
+    hits = client.get("/products/cache-stats").json()["product_pages"]["hits"]
+    assert client.get(f"/products?search={tag}").json()["items"][0]["stock"] == 5
+    assert client.get("/products/cache-stats").json()["product_pages"]["hits"] == hits + 1
+
+    client.post("/cart", json={"product_id": product["id"], "quantity": 2}, headers=headers)
+    assert client.post("/orders", headers=headers).status_code == 200
+    assert client.get(f"/products?search={tag}").json()["items"][0]["stock"] == 3
+
+
+def test_wishlist_is_idempotent_and_rejects_unknown_products():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    product = client.post(
+        "/products", json={"name": "Wished", "description": "Want it", "price": 3, "stock": 1}, headers=headers,
+    ).json()
+
+    for _ in range(2):
+        assert client.post(f"/wishlist?product_id={product['id']}", headers=headers).status_code == 200
+    assert [item["product_id"] for item in client.get("/wishlist", headers=headers).json()] == [product["id"]]
+    assert client.post("/wishlist?product_id=999999999", headers=headers).status_code == 404
+
+
+def test_sync_engine_path_runs_the_async_crud():
+    # USE_ASYNC_DB=0 serves requests through ThreadedSession
+    async def first_page():
+        db = ThreadedSession(SessionLocal())
+        try:
+            return await crud.get_products(db, sort="price", limit=2)
+        finally:
+            await db.close()
+
+    items, _ = asyncio.run(first_page())
+    assert [p.price for p in items] == sorted(p.price for p in items)
+
+
+def test_product_listing_reports_sql_timing():
+    timing = client.get("/products").headers["server-timing"]
+    queries = int(timing.split('desc="')[1].split(" ")[0])
+    assert timing.startswith("db;dur=") and queries >= 1
+
@@ -0,0 +1,122 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+# Per-request SQL instrumentation.
+#
+# instrument(engine) times every statement through engine events, and
+# SQLInstrumentationMiddleware gives each HTTP request its own tally. The response
+# gets a Server-Timing header (query count and DB time so far), and a sample of
+# requests, plus every request that ran a slow statement, is logged as one JSON
+# line with its slowest statements. A statement slower than SLOW_QUERY_MS is also
+# logged on its own with its parameters.
+#
+# Shared by every app; each app's instrumentation.py re-exports it.
+
+__all__ = ["RequestStats", "SQLInstrumentationMiddleware", "current_stats", "instrument"]
+
+logger = logging.getLogger("sql")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", "0.01"))
+SERVER_TIMING = os.getenv("SQL_SERVER_TIMING", "1") != "0"
+SLOWEST_KEPT = 3
+STATEMENT_LOG_CHARS = 500
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_ms", "slowest", "slow")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slowest = []
+        self.slow = False
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        self.slow = self.slow or elapsed_ms >= SLOW_QUERY_MS
+        if len(self.slowest) < SLOWEST_KEPT or elapsed_ms > self.slowest[-1][0]:
+            self.slowest = sorted(self.slowest + [(elapsed_ms, statement)], key=lambda entry: -entry[0])[:SLOWEST_KEPT]
+
+    def server_timing(self, total_ms: float) -> str:
+        return f'db;dur={self.db_ms:.1f};desc="{self.queries} queries", app;dur={total_ms:.1f}'
+
+
+_current = contextvars.ContextVar("sql_request_stats", default=None)
+
+
+def current_stats():
+    """The running request's RequestStats, or None outside a request."""
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - context._query_started) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning("slow query %.1f ms: %s; parameters=%.*s", elapsed_ms, statement,
+                       STATEMENT_LOG_CHARS, repr(parameters))
+
+
+def instrument(engine):
+    """Time every statement run through `engine` (sync or async)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLInstrumentationMiddleware:
+    def __init__(self, app, sample_rate: float = SQL_LOG_SAMPLE_RATE, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    # Queries a streaming body runs after this point are in the log line only
+                    total_ms = (time.perf_counter() - started) * 1000
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing(total_ms))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if stats.slow or (stats.queries and random.random() < self.sample_rate):
+                logger.info(json.dumps({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "queries": stats.queries,
+                    "db_ms": round(stats.db_ms, 1),
+                    "slowest": [
+                        {"ms": round(ms, 1), "statement": statement[:STATEMENT_LOG_CHARS]}
+                        for ms, statement in stats.slowest
+                    ],
+                }))
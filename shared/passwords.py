@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+__all__ = ["PasswordHasher", "password_hasher", "pwd_context"]
+
+# Password hashing; hashes below min_rounds are upgraded on the next successful login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__min_rounds=12)
+
+
+# Worker entry points; must stay module level so the pool can pickle them.
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a process pool so a login burst can't starve the worker.
+
+    At most `max_pending` hashes may be queued or running; beyond that callers get
+    a 503 straight away instead of piling up behind the pool. `workers=0` hashes on
+    the request threadpool like the old sync routes did, for A/B benchmarks.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 8
+        self._pool = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the parent has an event loop and DB connections
+                context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _discard(self, pool):
+        with self._lock:
+            # Another caller may already have replaced it
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    async def _run(self, fn, *args):
+        if self.workers == 0:
+            return await run_in_threadpool(fn, *args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many authentication requests, retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        loop = asyncio.get_running_loop()
+        try:
+            pool = self._executor()
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                # A worker died (crashed, OOM-killed) and took the pool with it: retry once on a new one
+                self._discard(pool)
+                return await loop.run_in_executor(self._executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        """Return (valid, new_hash); new_hash is set when the stored hash uses
+        deprecated settings and should be replaced."""
+        return await self._run(_verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher()
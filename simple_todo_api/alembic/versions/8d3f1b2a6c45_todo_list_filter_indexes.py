@@ -0,0 +1,37 @@
+"""todo list filter indexes
+
+Revision ID: 8d3f1b2a6c45
+Revises: c6f09a05eb6d
+Create Date: 2026-10-18 18:20:11.402873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3f1b2a6c45'
+down_revision: Union[str, Sequence[str], None] = 'c6f09a05eb6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("todo_items"):
+        return
+    indexes = {ix["name"] for ix in inspector.get_indexes("todo_items")}
+    if "ix_todo_items_completed_id" not in indexes:
+        op.create_index("ix_todo_items_completed_id", "todo_items", ["completed", "id"])
+    if "ix_todo_items_title" not in indexes:
+        op.create_index("ix_todo_items_title", "todo_items", ["title"],
+                        postgresql_ops={"title": "varchar_pattern_ops"})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_todo_items_title", table_name="todo_items")
+    op.drop_index("ix_todo_items_completed_id", table_name="todo_items")
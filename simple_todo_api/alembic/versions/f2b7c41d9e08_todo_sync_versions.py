@@ -0,0 +1,57 @@
+"""todo sync versions
+
+Revision ID: f2b7c41d9e08
+Revises: 8d3f1b2a6c45
+Create Date: 2026-10-18 19:05:48.917330
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7c41d9e08'
+down_revision: Union[str, Sequence[str], None] = '8d3f1b2a6c45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("todo_items"):
+        return
+    if "version" not in {column["name"] for column in inspector.get_columns("todo_items")}:
+        op.add_column("todo_items", sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"))
+        op.create_index("ix_todo_items_version", "todo_items", ["version"])
+    if not inspector.has_table("todo_tombstones"):
+        op.create_table(
+            "todo_tombstones",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("item_id", sa.Integer(), nullable=False),
+            sa.Column("version", sa.BigInteger(), nullable=False),
+        )
+        op.create_index("ix_todo_tombstones_item_id", "todo_tombstones", ["item_id"])
+        op.create_index("ix_todo_tombstones_version", "todo_tombstones", ["version"])
+    if not inspector.has_table("todo_sync_state"):
+        op.create_table(
+            "todo_sync_state",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.BigInteger(), nullable=False),
+        )
+        # Existing items become version 1, so a first sync from since=0 returns them all
+        op.execute("INSERT INTO todo_sync_state (id, version) VALUES (1, 1)")
+        op.execute("UPDATE todo_items SET version = 1")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("todo_sync_state")
+    op.drop_index("ix_todo_tombstones_version", table_name="todo_tombstones")
+    op.drop_index("ix_todo_tombstones_item_id", table_name="todo_tombstones")
+    op.drop_table("todo_tombstones")
+    op.drop_index("ix_todo_items_version", table_name="todo_items")
+    with op.batch_alter_table("todo_items") as batch_op:
+        batch_op.drop_column("version")
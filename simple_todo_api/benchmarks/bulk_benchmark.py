@@ -0,0 +1,85 @@
+"""Sync N todos through the single-item endpoints and through the bulk endpoints,
+against a temporary SQLite database, and compare wall time and round trips.
+
+Usage (from simple_todo_api/):
+    python benchmarks/bulk_benchmark.py                  # 500 items
+    python benchmarks/bulk_benchmark.py --items 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import main
+from database import Base, get_db
+
+
+def use_database(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    return engine
+
+
+async def single(client, n):
+    ids = []
+    for i in range(n):
+        ids.append((await client.post("/todos/", json={"title": f"Item {i}"})).json()["id"])
+    for item_id in ids:
+        await client.put(f"/todos/{item_id}/", json={"completed": True})
+    for item_id in ids:
+        await client.delete(f"/todos/{item_id}/")
+    return 3 * n
+
+
+async def bulk(client, n):
+    created = (await client.post("/todos/bulk", json={"items": [{"title": f"Item {i}"} for i in range(n)]})).json()
+    ids = [item["id"] for item in created["items"]]
+    await client.patch("/todos/bulk", json={"items": [{"id": item_id, "completed": True} for item_id in ids]})
+    await client.request("DELETE", "/todos/bulk", json={"ids": ids})
+    return 3
+
+
+async def compare(engine, n):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    print(f"{'mode':<10}{'requests':>10}{'statements':>12}{'seconds':>10}")
+    async with httpx.AsyncClient(app=main.app, base_url="http://bench") as client:
+        for label, run in (("single", single), ("bulk", bulk)):
+            statements.clear()
+            start = time.perf_counter()
+            requests = await run(client, n)
+            print(f"{label:<10}{requests:>10}{len(statements):>12}{time.perf_counter() - start:>10.2f}")
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+    await engine.dispose()
+
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = use_database(os.path.join(tmp, "bench.db"))
+        print(f"\nCreate, complete and delete {n:,} todos")
+        asyncio.run(compare(engine, n))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=500)
+    args = parser.parse_args()
+    run(args.items)
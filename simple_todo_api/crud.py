@@ -1,38 +1,171 @@
+from sqlalchemy import delete, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from models import ToDoItem
-from schemas import ToDoCreate, ToDoUpdate
+from schemas import ToDoBulkUpdateItem, ToDoCreate, ToDoUpdate
+from sync import add_tombstones, change_feed, next_version
 from fastapi import HTTPException
 
 async def create_todo_item(db: AsyncSession, todo: ToDoCreate):
-    db_item = ToDoItem(**todo.dict())
+    db_item = ToDoItem(**todo.dict(), version=await next_version(db))
     db.add(db_item)
     await db.commit()
     await db.refresh(db_item)
+    change_feed.publish()
     return db_item
 
-async def get_todo_items(db: AsyncSession):
-    result = await db.execute(select(ToDoItem))
-    return result.scalars().all()
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 1000
+
+def _todo_query(completed: bool | None = None, title_prefix: str | None = None):
+    query = select(ToDoItem)
+    if completed is not None:
+        query = query.filter(ToDoItem.completed == completed)
+    if title_prefix:
+        # Escaped so the prefix is matched literally and the title index can serve it
+        escaped = title_prefix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+        query = query.filter(ToDoItem.title.like(escaped + "%", escape="/"))
+    return query
+
+async def get_todo_items(db: AsyncSession, completed: bool | None = None, title_prefix: str | None = None,
+                         cursor: int | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    """One page of items in id order after id `cursor`; returns (items, next_cursor)."""
+    query = _todo_query(completed, title_prefix)
+    if cursor is not None:
+        query = query.filter(ToDoItem.id > cursor)
+    # One extra row tells whether there is a next page without a COUNT(*)
+    result = await db.execute(query.order_by(ToDoItem.id).limit(limit + 1))
+    items = result.scalars().all()
+    next_cursor = items[limit - 1].id if len(items) > limit else None
+    return items[:limit], next_cursor
+
+async def iter_todo_items(db: AsyncSession, completed: bool | None = None, title_prefix: str | None = None,
+                          chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield lists of up to `chunk_size` items, read through a server-side cursor
+    so only one chunk is held in memory at a time."""
+    query = _todo_query(completed, title_prefix).order_by(ToDoItem.id).execution_options(yield_per=chunk_size)
+    result = await db.stream(query)
+    async for chunk in result.scalars().partitions(chunk_size):
+        yield chunk
+        # Each chunk was validated and sent; don't keep its rows in the identity map
+        db.expunge_all()
 
 async def get_todo_item_by_id(db: AsyncSession, item_id: int):
     result = await db.execute(select(ToDoItem).filter(ToDoItem.id == item_id))
     return result.scalars().first()
 
 async def update_todo_item(db: AsyncSession, item_id: int, todo_update: ToDoUpdate):
+    values = todo_update.dict(exclude_unset=True)
+    if values and db.bind.dialect.update_returning:
+        values["version"] = await next_version(db)
+        # One UPDATE ... RETURNING instead of SELECT, UPDATE, SELECT; no row back means no item
+        result = await db.execute(
+            update(ToDoItem).filter(ToDoItem.id == item_id).values(**values).returning(ToDoItem)
+            .execution_options(synchronize_session=False)
+        )
+        db_item = result.scalars().first()
+        if not db_item:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="Item not found")
+        await db.commit()
+        change_feed.publish()
+        return db_item
     db_item = await get_todo_item_by_id(db, item_id)
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
-    for key, value in todo_update.dict(exclude_unset=True).items():
+    if values:
+        values["version"] = await next_version(db)
+    for key, value in values.items():
         setattr(db_item, key, value)
     await db.commit()
     await db.refresh(db_item)
+    change_feed.publish()
     return db_item
 
 async def delete_todo_item(db: AsyncSession, item_id: int):
-    db_item = await get_todo_item_by_id(db, item_id)
+    version = await next_version(db)
+    if db.bind.dialect.delete_returning:
+        result = await db.execute(
+            delete(ToDoItem).filter(ToDoItem.id == item_id).returning(ToDoItem)
+            .execution_options(synchronize_session=False)
+        )
+        db_item = result.scalars().first()
+    else:
+        db_item = await get_todo_item_by_id(db, item_id)
+        if db_item:
+            await db.delete(db_item)
     if not db_item:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Item not found")
-    await db.delete(db_item)
+    await add_tombstones(db, [item_id], version)
     await db.commit()
+    change_feed.publish()
     return db_item
+
+async def _existing_ids(db: AsyncSession, item_ids: list[int]) -> set[int]:
+    result = await db.execute(select(ToDoItem.id).filter(ToDoItem.id.in_(item_ids)))
+    return set(result.scalars().all())
+
+async def create_todo_items(db: AsyncSession, todos: list[ToDoCreate]):
+    """Insert every item in one transaction; returns them in request order with their ids."""
+    try:
+        version = await next_version(db)
+        rows = [{**todo.dict(), "version": version} for todo in todos]
+        if db.bind.dialect.insert_returning:
+            # One multi-row INSERT ... VALUES (...), (...) RETURNING; ids are handed out in
+            # VALUES order, so sorting by id restores the request order
+            result = await db.execute(insert(ToDoItem).values(rows).returning(ToDoItem))
+            items = sorted(result.scalars().all(), key=lambda item: item.id)
+        else:
+            # No RETURNING (MySQL): the ORM needs each generated id back, so it inserts row by row
+            items = [ToDoItem(**row) for row in rows]
+            db.add_all(items)
+            await db.flush()
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    change_feed.publish()
+    return items
+
+async def update_todo_items(db: AsyncSession, updates: list[ToDoBulkUpdateItem]):
+    """Apply every update in one transaction; returns (id, status) per item in request order.
+
+    Items setting the same fields share one executemany UPDATE by primary key.
+    """
+    found = await _existing_ids(db, [item.id for item in updates])
+    rows = [item.dict(exclude_unset=True) for item in updates if item.id in found]
+    try:
+        if rows:
+            version = await next_version(db)
+            await db.execute(update(ToDoItem), [{**row, "version": version} for row in rows])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    change_feed.publish()
+    return [(item.id, "updated" if item.id in found else "not_found") for item in updates]
+
+async def delete_todo_items(db: AsyncSession, item_ids: list[int]):
+    """Delete every item with one DELETE ... WHERE id IN (...); returns (id, status) per id."""
+    statement = delete(ToDoItem).execution_options(synchronize_session=False)
+    try:
+        version = await next_version(db)
+        if db.bind.dialect.delete_returning:
+            result = await db.execute(statement.filter(ToDoItem.id.in_(item_ids)).returning(ToDoItem.id))
+            found = set(result.scalars().all())
+        else:
+            found = await _existing_ids(db, item_ids)
+            if found:
+                await db.execute(statement.filter(ToDoItem.id.in_(found)))
+        if found:
+            await add_tombstones(db, found, version)
+            await db.commit()
+        else:
+            await db.rollback()
+    except Exception:
+        await db.rollback()
+        raise
+    change_feed.publish()
+    return [(item_id, "deleted" if item_id in found else "not_found") for item_id in item_ids]
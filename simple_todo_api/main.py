@@ -1,8 +1,20 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import Base, engine, get_db
-from schemas import ToDoCreate, ToDoResponse, ToDoUpdate
-from crud import create_todo_item, get_todo_items, get_todo_item_by_id, update_todo_item, delete_todo_item
+from database import AsyncSessionLocal, Base, engine, get_db
+from instrumentation import SQLInstrumentationMiddleware
+from schemas import (
+    ToDoBulkCreate, ToDoBulkCreated, ToDoBulkDelete, ToDoBulkResult, ToDoBulkUpdate,
+    ToDoChanges, ToDoCreate, ToDoPage, ToDoResponse, ToDoUpdate,
+)
+from crud import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, create_todo_item, get_todo_items, iter_todo_items,
+    get_todo_item_by_id, update_todo_item, delete_todo_item,
+    create_todo_items, update_todo_items, delete_todo_items,
+)
+from sync import MAX_WAIT_SECONDS, RECHECK_SECONDS, change_feed, get_changes
 
 app = FastAPI(
     title="Simple To-Do API",
@@ -12,6 +24,7 @@ app = FastAPI(
     redoc_url="/redoc",
     openapi_url="/openapi.json"
 )
+app.add_middleware(SQLInstrumentationMiddleware)
 
 # Create database tables on startup
 @app.on_event("startup")
@@ -24,10 +37,59 @@ async def on_startup():
 async def add_todo(todo: ToDoCreate, db: AsyncSession = Depends(get_db)):
     return await create_todo_item(db, todo)
 
-# List all To-Do items
-@app.get("/todos/", response_model=list[ToDoResponse])
-async def list_todos(db: AsyncSession = Depends(get_db)):
-    return await get_todo_items(db)
+# List To-Do items, a page at a time or streamed as NDJSON
+@app.get("/todos/", response_model=ToDoPage)
+async def list_todos(
+    completed: bool | None = None,
+    title_prefix: str | None = Query(None, max_length=255),
+    cursor: int | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    if stream:
+        async def lines():
+            # Own session: the stream outlives the request's dependencies
+            async with AsyncSessionLocal() as session:
+                async for chunk in iter_todo_items(session, completed, title_prefix):
+                    yield "".join(ToDoResponse.from_orm(item).json() + "\n" for item in chunk)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    items, next_cursor = await get_todo_items(db, completed, title_prefix, cursor, limit)
+    return {"items": items, "next_cursor": next_cursor}
+
+# Bulk create, update and delete: one request and one transaction for many items
+@app.post("/todos/bulk", response_model=ToDoBulkCreated)
+async def add_todos(bulk: ToDoBulkCreate, db: AsyncSession = Depends(get_db)):
+    return {"items": await create_todo_items(db, bulk.items)}
+
+@app.patch("/todos/bulk", response_model=ToDoBulkResult)
+async def modify_todos(bulk: ToDoBulkUpdate, db: AsyncSession = Depends(get_db)):
+    results = await update_todo_items(db, bulk.items)
+    return {"results": [{"id": item_id, "status": status} for item_id, status in results]}
+
+@app.delete("/todos/bulk", response_model=ToDoBulkResult)
+async def remove_todos(bulk: ToDoBulkDelete, db: AsyncSession = Depends(get_db)):
+    results = await delete_todo_items(db, bulk.ids)
+    return {"results": [{"id": item_id, "status": status} for item_id, status in results]}
+
+# Changes since a version, for clients keeping a local copy; `wait` turns it into a long poll
+@app.get("/todos/changes", response_model=ToDoChanges)
+async def list_changes(
+    since: int = Query(0, ge=0, description="version from the previous response"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS, description="seconds to hold the request open for changes"),
+    db: AsyncSession = Depends(get_db),
+):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        changes, version, has_more = await get_changes(db, since, limit)
+        remaining = deadline - loop.time()
+        if changes or remaining <= 0:
+            return {"changes": changes, "version": version, "has_more": has_more}
+        # Give the connection back to the pool while waiting
+        await db.close()
+        await change_feed.wait(min(remaining, RECHECK_SECONDS))
 
 # Get single To-Do item
 @app.get("/todos/{item_id}/", response_model=ToDoResponse)
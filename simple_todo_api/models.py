@@ -1,10 +1,38 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, Index, event
 from database import Base
 
 class ToDoItem(Base):
     __tablename__ = "todo_items"
+    # completed + id serves the completed filter in page order; title serves prefix
+    # filters (pattern ops so PostgreSQL can use it for LIKE 'abc%' under any collation)
+    __table_args__ = (
+        Index("ix_todo_items_completed_id", "completed", "id"),
+        Index("ix_todo_items_title", "title", postgresql_ops={"title": "varchar_pattern_ops"}),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)  # ✅ Add length
     description = Column(String(1000), nullable=True)  # ✅ Optional length
     completed = Column(Boolean, default=False)
+    # Value of the sync counter when the item was last written, see sync.py
+    version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+
+class ToDoTombstone(Base):
+    """Left behind by a delete so GET /todos/changes can report it."""
+    __tablename__ = "todo_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False, index=True)
+    version = Column(BigInteger, nullable=False, index=True)
+
+class SyncState(Base):
+    """Single row holding the last version handed out."""
+    __tablename__ = "todo_sync_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+@event.listens_for(SyncState.__table__, "after_create")
+def _seed_sync_state(target, connection, **kw):
+    # Seeded with the table, so concurrent first writes never race to insert it
+    connection.execute(target.insert().values(id=1, version=0))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 
 class ToDoBase(BaseModel):
     title: str
@@ -18,3 +18,42 @@ class ToDoResponse(ToDoBase):
 
     class Config:
         orm_mode = True
+
+class ToDoPage(BaseModel):
+    items: list[ToDoResponse]
+    next_cursor: int | None = None
+
+MAX_BULK_ITEMS = 1000
+
+class ToDoBulkCreate(BaseModel):
+    items: conlist(ToDoCreate, min_items=1, max_items=MAX_BULK_ITEMS)
+
+class ToDoBulkUpdateItem(ToDoUpdate):
+    id: int
+
+class ToDoBulkUpdate(BaseModel):
+    items: conlist(ToDoBulkUpdateItem, min_items=1, max_items=MAX_BULK_ITEMS)
+
+class ToDoBulkDelete(BaseModel):
+    ids: conlist(int, min_items=1, max_items=MAX_BULK_ITEMS)
+
+class ToDoBulkCreated(BaseModel):
+    items: list[ToDoResponse]
+
+class ToDoBulkItemResult(BaseModel):
+    id: int
+    status: str
+
+class ToDoBulkResult(BaseModel):
+    results: list[ToDoBulkItemResult]
+
+class ToDoChange(BaseModel):
+    id: int
+    version: int
+    deleted: bool
+    item: ToDoResponse | None = None
+
+class ToDoChanges(BaseModel):
+    changes: list[ToDoChange]
+    version: int
+    has_more: bool
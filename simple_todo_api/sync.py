@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+from sqlalchemy import insert, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import SyncState, ToDoItem, ToDoTombstone
+
+# Incremental sync for todos.
+#
+# Every write transaction takes the next value of a single counter row and stamps
+# it on the items it inserts or updates, or on the tombstones of the items it
+# deletes. The counter row stays locked until the transaction commits, so versions
+# become visible in order and a client that has seen everything up to version N
+# can never later find an uncommitted N - 1. The price is that todo writes are
+# serialized on that row, and that each write transaction spends one extra
+# statement (UPDATE ... RETURNING where supported) on the bump.
+
+MAX_WAIT_SECONDS = 30
+# Long polls also re-read the database this often, to see writes made by other workers
+RECHECK_SECONDS = 1.0
+
+async def next_version(db: AsyncSession) -> int:
+    """Bump the counter inside the caller's transaction and return the new version."""
+    bump = update(SyncState).filter(SyncState.id == 1).values(version=SyncState.version + 1)
+    if db.bind.dialect.update_returning:
+        result = await db.execute(bump.returning(SyncState.version))
+        version = result.scalar()
+    else:
+        result = await db.execute(bump)
+        version = await db.scalar(select(SyncState.version).filter(SyncState.id == 1)) if result.rowcount else None
+    if version is None:
+        # The row is seeded with the table and by the migration; recreate it if it is
+        # gone, and if a concurrent write got there first, bump theirs instead
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(SyncState).values(id=1, version=1))
+        except IntegrityError:
+            return await next_version(db)
+        version = 1
+    return version
+
+async def add_tombstones(db: AsyncSession, item_ids, version: int):
+    if item_ids:
+        await db.execute(insert(ToDoTombstone), [{"item_id": item_id, "version": version} for item_id in item_ids])
+
+async def get_changes(db: AsyncSession, since: int, limit: int):
+    """Items written and deleted after version `since`, oldest first.
+
+    Returns (changes, version, has_more): pass `version` back as `since` for the
+    next call. A page ends on a version boundary, so it can hold a little more
+    than `limit` changes when the last version came from a bulk request.
+    """
+    changed = union_all(
+        select(ToDoItem.version).filter(ToDoItem.version > since),
+        select(ToDoTombstone.version).filter(ToDoTombstone.version > since),
+    ).subquery()
+    versions = (await db.execute(select(changed.c.version).order_by(changed.c.version).limit(limit))).scalars().all()
+    if not versions:
+        return [], since, False
+    upto = versions[-1]
+
+    items = await db.execute(select(ToDoItem).filter(ToDoItem.version > since, ToDoItem.version <= upto))
+    changes = {item.id: {"id": item.id, "version": item.version, "deleted": False, "item": item}
+               for item in items.scalars()}
+    tombstones = await db.execute(select(ToDoTombstone).filter(ToDoTombstone.version > since, ToDoTombstone.version <= upto))
+    for tombstone in tombstones.scalars():
+        # An id can come back after a delete on some backends; the later write wins
+        current = changes.get(tombstone.item_id)
+        if current is None or current["version"] < tombstone.version:
+            changes[tombstone.item_id] = {"id": tombstone.item_id, "version": tombstone.version, "deleted": True, "item": None}
+
+    has_more = await db.scalar(select(changed.c.version).filter(changed.c.version > upto).limit(1)) is not None
+    return sorted(changes.values(), key=lambda change: (change["version"], change["id"])), upto, has_more
+
+class ChangeFeed:
+    """Wakes long polls in this process when a todo write commits. Waiters are
+    futures on their own event loop, woken with call_soon_threadsafe."""
+
+    def __init__(self):
+        self._waiters = set()
+        self._lock = threading.Lock()
+
+    def publish(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                # Loop already closed; its request is gone
+                pass
+
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(None)
+
+    async def wait(self, timeout: float):
+        """Return after the next publish or after `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+change_feed = ChangeFeed()
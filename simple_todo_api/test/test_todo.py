@@ -1,5 +1,15 @@
+import json
+import logging
+import threading
+import time
+import uuid
+
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import database
 from main import app
+from shared import instrumentation
 
 client = TestClient(app)
 
@@ -11,7 +21,32 @@ def test_create_todo():
 def test_list_todos():
     response = client.get("/todos/")
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
+
+def test_list_todos_pages_filters_and_streams():
+    prefix = f"Paged {uuid.uuid4().hex[:8]}"
+    ids = [client.post("/todos/", json={"title": f"{prefix} {n}"}).json()["id"] for n in range(5)]
+    client.put(f"/todos/{ids[1]}/", json={"completed": True})
+
+    seen, cursor = [], None
+    while True:
+        params = {"title_prefix": prefix, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/todos/", params=params).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids
+
+    done = client.get("/todos/", params={"title_prefix": prefix, "completed": True}).json()["items"]
+    assert [item["id"] for item in done] == [ids[1]]
+    # LIKE wildcards in the prefix are matched literally
+    assert client.get("/todos/", params={"title_prefix": "%"}).json()["items"] == []
+
+    response = client.get("/todos/", params={"title_prefix": prefix, "completed": False, "stream": True})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [ids[0], *ids[2:]]
 
 def test_update_todo():
     # Assume the first item exists
@@ -22,3 +57,99 @@ def test_update_todo():
 def test_delete_todo():
     response = client.delete("/todos/1/")
     assert response.status_code == 200
+
+def test_bulk_create_update_delete():
+    response = client.post("/todos/bulk", json={"items": [{"title": f"Bulk {n}"} for n in range(3)]})
+    assert response.status_code == 200
+    created = response.json()["items"]
+    assert [item["title"] for item in created] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+    assert all(item["completed"] is False for item in created)
+    ids = [item["id"] for item in created]
+
+    response = client.patch("/todos/bulk", json={"items": [
+        {"id": ids[0], "completed": True},
+        {"id": ids[1], "title": "Bulk renamed", "description": "changed"},
+        {"id": 10**9, "completed": True},
+    ]})
+    assert response.json()["results"] == [
+        {"id": ids[0], "status": "updated"}, {"id": ids[1], "status": "updated"}, {"id": 10**9, "status": "not_found"},
+    ]
+    assert client.get(f"/todos/{ids[0]}/").json()["completed"] is True
+    assert client.get(f"/todos/{ids[1]}/").json()["title"] == "Bulk renamed"
+    assert client.get(f"/todos/{ids[0]}/").json()["title"] == "Bulk 0"
+
+    response = client.request("DELETE", "/todos/bulk", json={"ids": [ids[0], ids[2], 10**9]})
+    assert [result["status"] for result in response.json()["results"]] == ["deleted", "deleted", "not_found"]
+    assert client.get(f"/todos/{ids[2]}/").status_code == 404
+    assert client.get(f"/todos/{ids[1]}/").status_code == 200
+
+    assert client.post("/todos/bulk", json={"items": []}).status_code == 422
+
+def test_update_and_delete_write_with_returning():
+    item_id = client.post("/todos/", json={"title": "Returning", "description": "kept"}).json()["id"]
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    event.listen(database.engine.sync_engine, "before_cursor_execute", record)
+    try:
+        updated = client.put(f"/todos/{item_id}/", json={"completed": True}).json()
+        update_statements = len(statements)
+        statements.clear()
+        deleted = client.delete(f"/todos/{item_id}/").json()
+        delete_statements = len(statements)
+    finally:
+        event.remove(database.engine.sync_engine, "before_cursor_execute", record)
+    assert updated == {"id": item_id, "title": "Returning", "description": "kept", "completed": True}
+    assert deleted["id"] == item_id
+    if database.engine.dialect.update_returning:
+        # One UPDATE/DELETE ... RETURNING each, plus the sync version bump that every
+        # write pays (see sync.py); delete also records its tombstone
+        assert update_statements == 1 + 1 and delete_statements == 1 + 1 + 1
+
+    assert client.put(f"/todos/{item_id}/", json={"title": "Gone"}).status_code == 404
+    assert client.delete(f"/todos/{item_id}/").status_code == 404
+
+def test_changes_since_version_with_tombstones_and_long_poll():
+    start = client.get("/todos/changes", params={"since": 0, "limit": 1000}).json()
+    while start["has_more"]:
+        start = client.get("/todos/changes", params={"since": start["version"], "limit": 1000}).json()
+    since = start["version"]
+
+    kept = client.post("/todos/", json={"title": "Synced"}).json()["id"]
+    gone = client.post("/todos/", json={"title": "Synced then deleted"}).json()["id"]
+    client.put(f"/todos/{kept}/", json={"completed": True})
+    client.delete(f"/todos/{gone}/")
+
+    response = client.get("/todos/changes", params={"since": since}).json()
+    assert [(change["id"], change["deleted"]) for change in response["changes"]] == [(kept, False), (gone, True)]
+    assert response["changes"][0]["item"]["completed"] is True
+    assert response["has_more"] is False
+    versions = [change["version"] for change in response["changes"]]
+    assert versions == sorted(versions) and versions[-1] == response["version"]
+
+    # Caught up: nothing new, same version back
+    caught_up = client.get("/todos/changes", params={"since": response["version"]}).json()
+    assert caught_up == {"changes": [], "version": response["version"], "has_more": False}
+
+    # A long poll returns as soon as a write lands
+    writer = threading.Timer(0.3, lambda: client.post("/todos/", json={"title": "Pushed"}))
+    writer.start()
+    started = time.monotonic()
+    polled = client.get("/todos/changes", params={"since": response["version"], "wait": 10}).json()
+    writer.join()
+    assert time.monotonic() - started < 5
+    assert [change["item"]["title"] for change in polled["changes"]] == ["Pushed"]
+
+def test_requests_report_sql_timing_and_log_slow_queries(monkeypatch, caplog):
+    response = client.post("/todos/", json={"title": "Timed"})
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=") and 'desc="' in timing and "app;dur=" in timing
+    assert int(timing.split('desc="')[1].split(" ")[0]) >= 1
+
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.INFO, logger="sql"):
+        client.get(f"/todos/{response.json()['id']}/")
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(message.startswith("slow query") and "parameters=" in message for message in messages)
+    line = json.loads(next(message for message in messages if message.startswith("{")))
+    assert line["path"] == f"/todos/{response.json()['id']}/" and line["queries"] >= 1 and line["slowest"]
+
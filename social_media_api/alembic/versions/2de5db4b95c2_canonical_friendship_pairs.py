@@ -0,0 +1,91 @@
+"""canonical friendship pairs
+
+Revision ID: 2de5db4b95c2
+Revises: c7d3e58a9f21
+Create Date: 2026-10-18 14:02:51.730114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2de5db4b95c2'
+down_revision: Union[str, Sequence[str], None] = 'c7d3e58a9f21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows per statement; every batch commits on its own so writers are never held
+# off for longer than one batch.
+BATCH_SIZE = 1000
+
+
+def _canonicalize(bind):
+    """Rewrite every row as (smaller id, larger id), keeping who asked in requester_id."""
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, user1_id, user2_id, requester_id FROM friendships WHERE id > :last_id ORDER BY id LIMIT :size"
+        ), {"last_id": last_id, "size": BATCH_SIZE}).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        changes = [
+            {
+                "row_id": row.id,
+                "user1": min(row.user1_id, row.user2_id),
+                "user2": max(row.user1_id, row.user2_id),
+                "requester": row.requester_id if row.requester_id is not None else row.user1_id,
+            }
+            for row in rows if row.user1_id > row.user2_id or row.requester_id is None
+        ]
+        if changes:
+            bind.execute(sa.text(
+                "UPDATE friendships SET user1_id = :user1, user2_id = :user2, requester_id = :requester WHERE id = :row_id"
+            ), changes)
+
+
+def _duplicate_ids(bind):
+    """Ids to drop: self-friendships, and every row of a pair but its best one
+    (accepted over pending over rejected, then the oldest)."""
+    rows = bind.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(sa.text(
+        "SELECT id, user1_id, user2_id FROM friendships ORDER BY user1_id, user2_id, "
+        "CASE status WHEN 'accepted' THEN 0 WHEN 'pending' THEN 1 ELSE 2 END, id"
+    ))
+    losers, previous = [], None
+    for row in rows:
+        pair = (row.user1_id, row.user2_id)
+        if pair == previous or row.user1_id == row.user2_id:
+            losers.append(row.id)
+        previous = pair
+    return losers
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if not inspector.has_table("friendships"):
+        return
+    if "requester_id" not in {column["name"] for column in inspector.get_columns("friendships")}:
+        op.add_column("friendships", sa.Column("requester_id", sa.Integer(), nullable=True))
+    with op.get_context().autocommit_block():
+        # Inside the block get_bind() is the autocommit connection
+        bind = op.get_bind()
+        _canonicalize(bind)
+        losers = _duplicate_ids(bind)
+        for start in range(0, len(losers), BATCH_SIZE):
+            bind.execute(sa.text("DELETE FROM friendships WHERE id IN :ids").bindparams(
+                sa.bindparam("ids", expanding=True)), {"ids": losers[start:start + BATCH_SIZE]})
+        if "uq_friendships_pair" not in {ix["name"] for ix in inspector.get_indexes("friendships")}:
+            op.create_index("uq_friendships_pair", "friendships", ["user1_id", "user2_id"], unique=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema. Rows stay canonical and deduplicated."""
+    op.drop_index("uq_friendships_pair", table_name="friendships")
+    with op.batch_alter_table("friendships") as batch_op:
+        batch_op.drop_column("requester_id")
@@ -0,0 +1,57 @@
+"""index foreign key lookups
+
+Revision ID: 53150d704c0c
+Revises: 467b7aee81bc
+Create Date: 2026-10-18 11:20:42.118306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '53150d704c0c'
+down_revision: Union[str, Sequence[str], None] = '467b7aee81bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns, unique)
+INDEXES = [
+    ("uq_likes_user_post", "likes", ["user_id", "post_id"], True),
+    ("ix_likes_post_id", "likes", ["post_id"], False),
+    ("ix_comments_post_id", "comments", ["post_id"], False),
+    ("ix_notifications_user_id", "notifications", ["user_id"], False),
+    ("ix_friendships_user2_status", "friendships", ["user2_id", "status"], False),
+]
+
+
+def _drop_duplicate_likes(bind):
+    duplicates = bind.execute(sa.text(
+        "SELECT user_id, post_id, MIN(id) FROM likes GROUP BY user_id, post_id HAVING COUNT(*) > 1"
+    )).fetchall()
+    for user_id, post_id, keep_id in duplicates:
+        bind.execute(sa.text("DELETE FROM likes WHERE user_id = :user_id AND post_id = :post_id AND id <> :id"),
+                     {"user_id": user_id, "post_id": post_id, "id": keep_id})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if inspector.has_table("likes"):
+        _drop_duplicate_likes(bind)
+    # Tables created by the app's create_all may already carry these indexes
+    for name, table, columns, unique in INDEXES:
+        if inspector.has_table(table) and name not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, unique in reversed(INDEXES):
+        if inspector.has_table(table) and name in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
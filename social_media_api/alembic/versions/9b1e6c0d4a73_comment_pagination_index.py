@@ -0,0 +1,46 @@
+"""comment pagination index
+
+Revision ID: 9b1e6c0d4a73
+Revises: 2de5db4b95c2
+Create Date: 2026-10-18 16:02:37.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1e6c0d4a73'
+down_revision: Union[str, Sequence[str], None] = '2de5db4b95c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("comments"):
+        return
+    # Comments written before this revision keep a NULL created_at; their ids still order them
+    if "created_at" not in {column["name"] for column in inspector.get_columns("comments")}:
+        op.add_column("comments", sa.Column("created_at", sa.DateTime(), nullable=True))
+    indexes = {ix["name"] for ix in inspector.get_indexes("comments")}
+    if "ix_comments_post_id_id" not in indexes:
+        op.create_index("ix_comments_post_id_id", "comments", ["post_id", "id"])
+    # (post_id, id) serves every post_id lookup the single-column index did
+    if "ix_comments_post_id" in indexes:
+        op.drop_index("ix_comments_post_id", table_name="comments")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    indexes = {ix["name"] for ix in inspector.get_indexes("comments")}
+    if "ix_comments_post_id" not in indexes:
+        op.create_index("ix_comments_post_id", "comments", ["post_id"])
+    if "ix_comments_post_id_id" in indexes:
+        op.drop_index("ix_comments_post_id_id", table_name="comments")
+    with op.batch_alter_table("comments") as batch_op:
+        batch_op.drop_column("created_at")
@@ -0,0 +1,43 @@
+"""post like and comment counts
+
+Revision ID: a1018971bf60
+Revises: 53150d704c0c
+Create Date: 2026-10-18 12:05:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1018971bf60'
+down_revision: Union[str, Sequence[str], None] = '53150d704c0c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNT_COLUMNS = ["like_count", "comment_count"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("posts"):
+        return
+    existing = {column["name"] for column in inspector.get_columns("posts")}
+    for name in COUNT_COLUMNS:
+        if name not in existing:
+            op.add_column("posts", sa.Column(name, sa.Integer(), nullable=False, server_default="0"))
+    op.execute(
+        "UPDATE posts SET "
+        "like_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id), "
+        "comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("posts") as batch_op:
+        for name in reversed(COUNT_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,37 @@
+"""unread notification counter
+
+Revision ID: c7d3e58a9f21
+Revises: a1018971bf60
+Create Date: 2026-10-18 13:10:08.551920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d3e58a9f21'
+down_revision: Union[str, Sequence[str], None] = 'a1018971bf60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("users"):
+        return
+    if "unread_notifications" not in {column["name"] for column in inspector.get_columns("users")}:
+        op.add_column("users", sa.Column("unread_notifications", sa.Integer(), nullable=False, server_default="0"))
+    op.execute(
+        "UPDATE users SET unread_notifications = "
+        "(SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id AND NOT notifications.is_read)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("unread_notifications")
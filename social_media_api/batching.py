@@ -0,0 +1,89 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter(ABC):
+    """Buffers writes in memory and applies them from a background thread, one
+    transaction per `interval_ms`; `interval_ms=0` writes each one straight away.
+
+    Subclasses keep their buffer in `self._pending` (guarded by `self._lock`) and
+    implement `_empty`, `_write` and `_requeue`. The batch being written stays in
+    `self._inflight` until it commits, so readers adding unflushed writes on top
+    of the database don't briefly miss it.
+    """
+
+    name = "batch-writer"
+
+    def __init__(self, bind, interval_ms: int):
+        self.bind = bind
+        self.interval = interval_ms / 1000
+        self._pending = self._empty()
+        self._inflight = self._empty()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+
+    @abstractmethod
+    def _empty(self):
+        """A new, empty buffer."""
+
+    @abstractmethod
+    def _write(self, connection, batch) -> int:
+        """Apply `batch` on `connection`; the return value is passed back by flush()."""
+
+    @abstractmethod
+    def _requeue(self, batch):
+        """Merge a batch that failed to write back into `self._pending`."""
+
+    def _added(self):
+        """Call after buffering a write, outside `self._lock`."""
+        if not self.interval:
+            self.flush()
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns what `_write` reports."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, self._empty()
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                with self.bind.begin() as connection:
+                    written = self._write(connection, batch)
+            except Exception:
+                # Keep the batch so the next flush retries it
+                with self._lock:
+                    self._requeue(batch)
+                    self._inflight = self._empty()
+                raise
+            with self._lock:
+                self._inflight = self._empty()
+            self.flushes += 1
+            return written
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("%s flush failed; retrying next interval", self.name)
+
+    def shutdown(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        self.flush()
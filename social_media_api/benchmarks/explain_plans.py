@@ -0,0 +1,66 @@
+"""Print SQLite's EXPLAIN QUERY PLAN for the hot foreign-key lookups, without and
+with the indexes added in migrations 53150d704c0c,
+2de5db4b95c2 and 9b1e6c0d4a73.
+
+Usage (from social_media_api/):
+    python benchmarks/explain_plans.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, or_, select, text
+
+from database import Base
+from models import Comment, Friendship, Like, Notification
+
+NEW_INDEXES = [
+    "uq_likes_user_post", "ix_likes_post_id", "ix_comments_post_id_id",
+    "ix_notifications_user_id", "ix_friendships_user2_status", "uq_friendships_pair",
+]
+
+QUERIES = {
+    "GET /likes/{post_id}": select(Like).filter_by(post_id=1),
+    "DELETE /like/{post_id}": select(Like).filter_by(user_id=1, post_id=1),
+    "GET /comments/{post_id}": select(Comment).filter(Comment.post_id == 1, Comment.id < 500)
+    .order_by(Comment.id.desc()).limit(21),
+    "GET /notifications": select(Notification).filter_by(user_id=1),
+    "GET /friend-requests": select(Friendship).filter(
+        or_(Friendship.user1_id == 1, Friendship.user2_id == 1),
+        Friendship.status == "pending", Friendship.requester_id != 1,
+    ),
+    "DELETE /friends/{friend_id}": select(Friendship).filter_by(user1_id=1, user2_id=2),
+}
+
+
+def indexes(tables):
+    return [index for table in tables for index in table.indexes if index.name in NEW_INDEXES]
+
+
+def print_plans(engine, label):
+    print(f"\n== {label} ==")
+    with engine.connect() as connection:
+        for route, query in QUERIES.items():
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+            print(f"{route:<28} " + " | ".join(row[-1] for row in plan))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'explain.db')}")
+        Base.metadata.create_all(bind=engine)
+        new_indexes = indexes(Base.metadata.sorted_tables)
+        for index in new_indexes:
+            index.drop(engine)
+        print_plans(engine, "before")
+        for index in new_indexes:
+            index.create(engine)
+        print_plans(engine, "after")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare friend lookups and friend-of-friend suggestions done in SQL with the
+in-memory FriendGraph index, on a synthetic graph.
+
+Usage (from social_media_api/):
+    python benchmarks/friend_graph_benchmark.py                  # 1M edges over 100k users
+    python benchmarks/friend_graph_benchmark.py --edges 200000 --users 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database import Base, async_url
+from friend_graph import SUGGESTION_LIMIT, FriendGraph, canonical_pair
+
+INSERT = "INSERT INTO friendships (user1_id, user2_id, requester_id, status) VALUES (?, ?, ?, ?)"
+SAMPLES = 200
+SQL_SAMPLES = 20
+
+SQL_FRIENDS = text(
+    "SELECT user1_id, user2_id FROM friendships "
+    "WHERE status = 'accepted' AND (user1_id = :user_id OR user2_id = :user_id)"
+)
+SQL_SUGGESTIONS = text("""
+    WITH edges AS (
+        SELECT user1_id AS a, user2_id AS b FROM friendships WHERE status = 'accepted'
+        UNION ALL
+        SELECT user2_id, user1_id FROM friendships WHERE status = 'accepted'
+    ), mine AS (SELECT b AS id FROM edges WHERE a = :user_id)
+    SELECT edges.b, COUNT(*) AS mutual FROM edges JOIN mine ON edges.a = mine.id
+    WHERE edges.b <> :user_id AND edges.b NOT IN (SELECT id FROM mine)
+    GROUP BY edges.b ORDER BY mutual DESC, edges.b LIMIT :limit
+""")
+
+
+def populate(engine, users, edges, rng):
+    seen = set()
+    batch = []
+    with engine.begin() as connection:
+        raw = connection.connection.driver_connection
+        while len(seen) < edges:
+            requester, other = rng.randint(1, users), rng.randint(1, users)
+            pair = canonical_pair(requester, other)
+            if requester == other or pair in seen:
+                continue
+            seen.add(pair)
+            batch.append((*pair, requester, "accepted"))
+            if len(batch) == 100000:
+                raw.executemany(INSERT, batch)
+                batch.clear()
+        if batch:
+            raw.executemany(INSERT, batch)
+
+
+async def per_call_ms(samples, call):
+    start = time.perf_counter()
+    for user_id in samples:
+        await call(user_id)
+    return (time.perf_counter() - start) * 1000 / len(samples)
+
+
+async def compare(url, users, rng):
+    engine = create_async_engine(async_url(url))
+    samples = [rng.randint(1, users) for _ in range(SAMPLES)]
+    async with AsyncSession(engine) as db:
+        graph = FriendGraph(maxsize=users * 2)
+        rows = [
+            ("friends (SQL)", await per_call_ms(samples[:SQL_SAMPLES], lambda u: db.execute(SQL_FRIENDS, {"user_id": u}))),
+            ("friends (graph, cold)", await per_call_ms(samples, lambda u: graph.neighbors(db, u))),
+            ("friends (graph, warm)", await per_call_ms(samples, lambda u: graph.neighbors(db, u))),
+            ("suggestions (SQL)", await per_call_ms(
+                samples[:SQL_SAMPLES], lambda u: db.execute(SQL_SUGGESTIONS, {"user_id": u, "limit": SUGGESTION_LIMIT}))),
+            ("suggestions (graph)", await per_call_ms(samples, lambda u: graph.suggestions(db, u))),
+            ("suggestions (graph, warm)", await per_call_ms(samples, lambda u: graph.suggestions(db, u))),
+        ]
+    for label, ms in rows:
+        print(f"{label:<28}{ms:>12.3f}")
+    await engine.dispose()
+
+
+def run(users, edges):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        start = time.perf_counter()
+        populate(engine, users, edges, rng)
+        print(f"\n{edges:,} friendships over {users:,} users (insert {time.perf_counter() - start:.1f}s)")
+        print(f"{'operation':<28}{'ms / call':>12}")
+        asyncio.run(compare(url, users, rng))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.users, args.edges)
@@ -0,0 +1,122 @@
+"""Time GET /search/posts queries against the FTS5 index and against a LIKE scan
+of posts.content, on synthetic posts in a temporary SQLite database.
+
+Usage (from social_media_api/):
+    python benchmarks/search_benchmark.py                  # 1M posts
+    python benchmarks/search_benchmark.py --posts 100000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database import Base, async_url
+import models  # noqa: F401 (registers the tables)
+import search
+
+INSERT = "INSERT INTO posts (user_id, content, created_at, like_count, comment_count) VALUES (?, ?, ?, 0, 0)"
+VOCABULARY = 20_000
+WORDS_PER_POST = 12
+# Incremental inserts timed with the index triggers in place
+LIVE_INSERTS = 10_000
+SAMPLES = 50
+LIKE_SAMPLES = 5
+
+LIKE_SCAN = text(
+    "SELECT id FROM posts WHERE lower(content) LIKE :pattern ORDER BY id LIMIT :limit"
+)
+
+
+def word(n):
+    return f"w{n}"
+
+
+def populate(engine, posts, rng):
+    # Zipf-like word frequencies, so queries range from very common to rare terms
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+    words = [word(n) for n in range(VOCABULARY)]
+    with engine.begin() as connection:
+        raw = connection.connection.driver_connection
+        for start in range(0, posts, 100_000):
+            batch = [
+                (rng.randint(1, 10_000), " ".join(rng.choices(words, cum_weights=cum_weights, k=WORDS_PER_POST)), "2026-01-01")
+                for _ in range(min(100_000, posts - start))
+            ]
+            raw.executemany(INSERT, batch)
+
+
+async def per_call_ms(samples, call):
+    start = time.perf_counter()
+    for sample in samples:
+        await call(sample)
+    return (time.perf_counter() - start) * 1000 / len(samples)
+
+
+async def compare(url, rng):
+    engine = create_async_engine(async_url(url))
+    queries = {
+        "common term": [word(rng.randint(0, 20)) for _ in range(SAMPLES)],
+        "rare term": [word(rng.randint(5000, VOCABULARY - 1)) for _ in range(SAMPLES)],
+        "two terms": [f"{word(rng.randint(0, 50))} {word(rng.randint(50, 500))}" for _ in range(SAMPLES)],
+    }
+    rows = []
+    async with AsyncSession(engine) as db:
+        for label, samples in queries.items():
+            rows.append((f"{label} (LIKE scan)", await per_call_ms(
+                samples[:LIKE_SAMPLES],
+                lambda q: db.execute(LIKE_SCAN, {"pattern": f"%{q.split()[0]} %", "limit": search.SEARCH_PAGE_SIZE}),
+            )))
+            rows.append((f"{label} (FTS5, page 1)", await per_call_ms(samples, lambda q: search.search_posts(db, q))))
+
+            async def third_page(q):
+                _, cursor = await search.search_posts(db, q)
+                for _ in range(2):
+                    if cursor is None:
+                        break
+                    _, cursor = await search.search_posts(db, q, search.parse_cursor(cursor))
+            rows.append((f"{label} (FTS5, pages 1-3)", await per_call_ms(samples[:10], third_page)))
+    for label, ms in rows:
+        print(f"{label:<34}{ms:>12.3f}")
+    await engine.dispose()
+
+
+def run(posts):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        start = time.perf_counter()
+        populate(engine, posts, rng)
+        inserted = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            search.create_index(connection)
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        populate(engine, LIVE_INSERTS, rng)
+        live_us = (time.perf_counter() - start) * 1e6 / LIVE_INSERTS
+
+        print(f"\n{posts:,} posts (insert {inserted:.1f}s, index build {built:.1f}s, "
+              f"{live_us:.0f} us/insert with the index triggers)")
+        print(f"{'query':<34}{'ms / call':>12}")
+        asyncio.run(compare(url, rng))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.posts)
@@ -0,0 +1,156 @@
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+
+from sqlalchemy import delete, exists, or_, select
+
+from counters import APPLY_DELTAS
+from database import engine
+from dependencies import invalidate_user
+from models import Comment, Friendship, Like, Notification, Post, User
+import posts
+import trending
+
+logger = logging.getLogger(__name__)
+
+# Deleting a post or user removes the rows hanging off it with set-based DELETEs.
+# Small fan-outs go in the request's own transaction; bigger ones are handed to a
+# background thread that deletes PURGE_CHUNK rows per transaction, so no single
+# statement holds the write lock for long. Parents are deleted last: if the
+# process dies mid-purge the post or user is still there and can be deleted again.
+PURGE_CHUNK = int(os.getenv("PURGE_CHUNK", "1000"))
+# Posts with at most this many likes + comments are purged inline
+INLINE_PURGE_LIMIT = PURGE_CHUNK
+
+likes = Like.__table__
+comments = Comment.__table__
+
+
+async def delete_post_inline(db, post_id: int):
+    """Delete a post and its likes and comments in the caller's transaction."""
+    await db.execute(delete(Like).filter(Like.post_id == post_id))
+    await db.execute(delete(Comment).filter(Comment.post_id == post_id))
+    await db.execute(delete(Post).filter(Post.id == post_id))
+
+
+def _delete_in_chunks(bind, table, criterion, chunk: int, counter: str = None) -> int:
+    """Delete rows matching `criterion`, `chunk` at a time, one transaction each.
+
+    With `counter` ("likes" or "comments") the posts the rows belonged to have
+    that count lowered in the same transaction. Returns the number deleted.
+    """
+    columns = [table.c.id, table.c.post_id] if counter else [table.c.id]
+    deleted = 0
+    while True:
+        with bind.begin() as connection:
+            rows = connection.execute(select(*columns).where(criterion).limit(chunk)).all()
+            if rows:
+                connection.execute(delete(table).where(table.c.id.in_([row.id for row in rows])))
+            if rows and counter:
+                lost = Counter(row.post_id for row in rows)
+                connection.execute(APPLY_DELTAS, [
+                    {"post_id": post_id, "likes": 0, "comments": 0, counter: -n} for post_id, n in lost.items()
+                ])
+        deleted += len(rows)
+        if len(rows) < chunk:
+            return deleted
+
+
+class Purger:
+    """Runs purge jobs one after another on a daemon thread, started on first use."""
+
+    name = "purge"
+
+    def __init__(self, bind, chunk: int = PURGE_CHUNK):
+        self.bind = bind
+        self.chunk = chunk
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.purged = 0
+
+    def _submit(self, job, *args):
+        self._jobs.put((job, args))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def purge_post(self, post_id: int):
+        self._submit(self._purge_post, post_id)
+
+    def purge_user(self, user_id: int, username: str):
+        self._submit(self._purge_user, user_id, username)
+
+    def _purge_posts(self, criterion):
+        """Delete the posts matching `criterion` with their likes and comments."""
+        while True:
+            with self.bind.connect() as connection:
+                post_ids = connection.execute(select(Post.id).where(criterion).limit(self.chunk)).scalars().all()
+            if not post_ids:
+                return
+            self.purged += _delete_in_chunks(self.bind, likes, likes.c.post_id.in_(post_ids), self.chunk)
+            self.purged += _delete_in_chunks(self.bind, comments, comments.c.post_id.in_(post_ids), self.chunk)
+            with self.bind.begin() as connection:
+                # Likes or comments that slipped in since go with their post
+                connection.execute(delete(Like).where(Like.post_id.in_(post_ids)))
+                connection.execute(delete(Comment).where(Comment.post_id.in_(post_ids)))
+                connection.execute(delete(Post).where(Post.id.in_(post_ids)))
+            for post_id in post_ids:
+                posts.invalidate_post(post_id)
+            trending.forget_posts(post_ids)
+            self.purged += len(post_ids)
+
+    def _purge_post(self, post_id: int):
+        self._purge_posts(Post.id == post_id)
+
+    def _purge_user(self, user_id: int, username: str):
+        """Everything the user wrote or received, then the user row.
+
+        Their likes and comments on other users' posts come off those posts' counts.
+        """
+        self.purged += _delete_in_chunks(self.bind, likes, likes.c.user_id == user_id, self.chunk, "likes")
+        self.purged += _delete_in_chunks(self.bind, comments, comments.c.user_id == user_id, self.chunk, "comments")
+        self._purge_posts(Post.user_id == user_id)
+        notifications = Notification.__table__
+        self.purged += _delete_in_chunks(self.bind, notifications, notifications.c.user_id == user_id, self.chunk)
+        with self.bind.begin() as connection:
+            # Friendships are removed by the request; this catches any made since
+            connection.execute(delete(Friendship).where(
+                or_(Friendship.user1_id == user_id, Friendship.user2_id == user_id)
+            ))
+            connection.execute(delete(User).where(User.id == user_id))
+        invalidate_user(username)
+
+    def _run(self):
+        while True:
+            job, args = self._jobs.get()
+            try:
+                job(*args)
+            except Exception:
+                logger.exception("%s job %s%r failed", self.name, job.__name__, args)
+            finally:
+                self._jobs.task_done()
+
+    def join(self):
+        """Block until every submitted job has finished."""
+        self._jobs.join()
+
+    def purge_orphans(self) -> int:
+        """Delete likes and comments whose post no longer exists, e.g. left behind
+        by deletes made before this module existed. Returns the number deleted."""
+        deleted = 0
+        for table in (likes, comments):
+            orphaned = ~exists().where(Post.id == table.c.post_id)
+            deleted += _delete_in_chunks(self.bind, table, orphaned, self.chunk)
+        return deleted
+
+
+purger = Purger(engine)
+
+
+if __name__ == "__main__":
+    # Sweep job, e.g. from cron: python cleanup.py
+    print(f"Deleted {purger.purge_orphans()} orphaned likes and comments")
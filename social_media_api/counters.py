@@ -0,0 +1,134 @@
+import os
+import time
+
+from sqlalchemy import bindparam, func, or_, select, update
+
+from batching import BatchWriter
+from database import engine
+from models import Comment, Like, Post
+
+# Like/comment counters on posts. Routes record +1/-1 here instead of updating the
+# post row themselves; a background thread folds the deltas per post and applies
+# them every COUNTER_FLUSH_MS as one executemany UPDATE, so a burst of likes on a
+# hot post becomes a single row write. COUNTER_FLUSH_MS=0 writes each delta straight away.
+COUNTER_FLUSH_MS = int(os.getenv("COUNTER_FLUSH_MS", "250"))
+
+posts = Post.__table__
+
+APPLY_DELTAS = update(posts).where(posts.c.id == bindparam("post_id")).values(
+    like_count=posts.c.like_count + bindparam("likes"),
+    comment_count=posts.c.comment_count + bindparam("comments"),
+)
+
+
+# Reconciliation runs next to live workers, whose unflushed deltas make stored counts
+# trail the base tables for a moment. So a post is only corrected if its drift is
+# the same before and after waiting RECONCILE_SETTLE_SECONDS, which pending deltas
+# outlast only if their flushes keep failing. The correction is added as a delta,
+# and only if the stored counts are still the ones measured, so a flush landing
+# meanwhile is neither overwritten nor counted twice.
+RECONCILE_SETTLE_SECONDS = float(os.getenv("RECONCILE_SETTLE_SECONDS", str(max(5.0, COUNTER_FLUSH_MS / 50))))
+
+CORRECT_DRIFT = update(posts).where(
+    posts.c.id == bindparam("post_id"),
+    posts.c.like_count == bindparam("stored_likes"),
+    posts.c.comment_count == bindparam("stored_comments"),
+).values(
+    like_count=posts.c.like_count + bindparam("likes"),
+    comment_count=posts.c.comment_count + bindparam("comments"),
+)
+
+
+def drift_query(post_ids=None):
+    """(id, like_count, comment_count, likes, comments) of posts whose stored counts
+    differ from their likes/comments rows."""
+    likes = select(func.count(Like.id)).where(Like.post_id == posts.c.id).scalar_subquery()
+    comments = select(func.count(Comment.id)).where(Comment.post_id == posts.c.id).scalar_subquery()
+    query = select(posts.c.id, posts.c.like_count, posts.c.comment_count, likes.label("likes"),
+                   comments.label("comments")).where(or_(posts.c.like_count != likes, posts.c.comment_count != comments))
+    return query if post_ids is None else query.where(posts.c.id.in_(post_ids))
+
+
+def measure_drift(bind, post_ids=None) -> dict:
+    """post id -> (stored likes, stored comments, like drift, comment drift)."""
+    with bind.connect() as connection:
+        return {
+            row.id: (row.like_count, row.comment_count, row.likes - row.like_count, row.comments - row.comment_count)
+            for row in connection.execute(drift_query(post_ids))
+        }
+
+
+class CounterBuffer(BatchWriter):
+    """Coalesces counter deltas in memory and flushes them in batches.
+
+    Deltas are per process: until a flush, GET /posts/{id}/stats on this worker
+    adds them on top of the stored counts, other workers see them up to one
+    flush interval later.
+    """
+
+    name = "counter-flush"
+
+    def __init__(self, bind, interval_ms: int = COUNTER_FLUSH_MS):
+        super().__init__(bind, interval_ms)
+
+    def _empty(self):
+        return {}
+
+    def add(self, post_id: int, likes: int = 0, comments: int = 0):
+        with self._lock:
+            entry = self._pending.setdefault(post_id, [0, 0])
+            entry[0] += likes
+            entry[1] += comments
+        self._added()
+
+    def pending(self, post_id: int):
+        with self._lock:
+            likes, comments = self._pending.get(post_id, (0, 0))
+            inflight_likes, inflight_comments = self._inflight.get(post_id, (0, 0))
+        return likes + inflight_likes, comments + inflight_comments
+
+    def _write(self, connection, batch) -> int:
+        """Apply buffered deltas; returns the number of posts updated."""
+        params = [
+            {"post_id": post_id, "likes": likes, "comments": comments}
+            for post_id, (likes, comments) in batch.items() if likes or comments
+        ]
+        if params:
+            connection.execute(APPLY_DELTAS, params)
+        return len(params)
+
+    def _requeue(self, batch):
+        for post_id, (likes, comments) in batch.items():
+            entry = self._pending.setdefault(post_id, [0, 0])
+            entry[0] += likes
+            entry[1] += comments
+
+    def reconcile(self, settle: float = RECONCILE_SETTLE_SECONDS) -> int:
+        """Recompute drifted posts' counts from the likes and comments tables; safe
+        to run while web workers are serving. Blocks for `settle` seconds when
+        anything drifted. Returns the number of posts corrected."""
+        first = measure_drift(self.bind)
+        if not first:
+            return 0
+        time.sleep(settle)
+        second = measure_drift(self.bind, list(first))
+        params = [
+            {"post_id": post_id, "stored_likes": stored_likes, "stored_comments": stored_comments,
+             "likes": likes, "comments": comments}
+            for post_id, (stored_likes, stored_comments, likes, comments) in second.items()
+            # Drift that moved was unflushed deltas landing, not an error to fix
+            if first[post_id][2:] == (likes, comments)
+        ]
+        corrected = 0
+        with self.bind.begin() as connection:
+            for row in params:
+                corrected += connection.execute(CORRECT_DRIFT, row).rowcount
+        return corrected
+
+
+counter_buffer = CounterBuffer(engine)
+
+
+if __name__ == "__main__":
+    # Reconciliation job, e.g. from cron: python counters.py
+    print(f"Corrected counts on {counter_buffer.reconcile()} posts")
@@ -1,12 +1,107 @@
 # social_media_api/database.py
 
+import os
+
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from instrumentation import instrument
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./socialmedia.db")
+
+# Async driver for each backend (aiosqlite locally, asyncpg/aiomysql in production)
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "mysql": "mysql+aiomysql"}
+
+
+def async_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
 
-DATABASE_URL = "sqlite:///./socialmedia.db"
+# Requests use the async engine; USE_ASYNC_DB=0 switches them back to the sync
+# engine in the threadpool so the two can be A/B tested for throughput.
+USE_ASYNC_DB = os.getenv("USE_ASYNC_DB", "1") != "0"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SQLite allows one writer at a time; give queued writers time to get the lock
+sqlite_args = {"timeout": 30} if DATABASE_URL.startswith("sqlite") else {}
+
+# Sync engine: table creation, Alembic and the USE_ASYNC_DB=0 path
+connect_args = {"check_same_thread": False, **sqlite_args} if sqlite_args else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=sqlite_args)
+# Per-request query counts and DB time, see instrumentation.py
+instrument(engine)
+instrument(async_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
+
+
+class ThreadedSession:
+    """AsyncSession look-alike over a sync Session: every database call runs in
+    the threadpool, which is how the app behaved before the async port."""
+
+    def __init__(self, session):
+        self.sync_session = session
+        self.bind = session.bind
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def expunge_all(self):
+        self.sync_session.expunge_all()
+
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    async def merge(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.merge, *args, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_db():
+    if USE_ASYNC_DB:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
@@ -1,37 +1,123 @@
+import time
+from dataclasses import dataclass
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from database import get_db
 from models import User
+from cache import TTLCache
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 
+# Authenticated users are cached by token subject so protected routes skip the
+# users lookup. Entries never outlive the token that loaded them.
+PRINCIPAL_CACHE_TTL = 300
+principal_cache = TTLCache(maxsize=10000, ttl=PRINCIPAL_CACHE_TTL)
+# Accounts deleted by this worker: user id -> time of deletion. Tokens issued
+# before then are rejected even while unexpired and before the purge removes the
+# row (a later account that reuses the id logs in afresh). Kept for longer than
+# any access token lives. Other workers reject them once their cached principal expires and the
+# purge has run.
+REVOKED_USER_TTL = 3600
+revoked_users = TTLCache(maxsize=100000, ttl=REVOKED_USER_TTL)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+@dataclass(frozen=True)
+class Principal:
+    """The caller as described by the token's claims; no database row behind it."""
+    id: int
+    username: str
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    if payload.get("sub") is None or is_revoked(payload.get("user_id"), payload):
+        raise credentials_exception()
+    return payload
+
+
+def invalidate_user(username: str):
+    principal_cache.delete(username)
+
+
+def is_revoked(user_id, payload: dict) -> bool:
+    revoked_at = revoked_users.get(user_id)
+    return revoked_at is not None and payload.get("iat", 0) <= revoked_at
+
 
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
+def revoke_user(user_id: int, username: str):
+    """Reject the user's tokens from now on, e.g. once the account is deleted."""
+    revoked_users.set(user_id, time.time())
+    invalidate_user(username)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.username)
+    # A rename must also drop the entry cached under the old subject
+    for old_username in inspect(target).attrs.username.history.deleted:
+        invalidate_user(old_username)
+
+
+async def _load_user(payload: dict, db: AsyncSession) -> User:
+    username = payload["sub"]
+    cached = principal_cache.get(username)
+    if cached is not None and is_revoked(cached["id"], payload):
+        raise credentials_exception()
+    if cached is not None:
+        # Rebuild the row from the cache and attach it without a SELECT
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    result = await db.execute(select(User).filter(User.username == username))
+    user = result.scalars().first()
+    if user is None or is_revoked(user.id, payload):
+        raise credentials_exception()
+    ttl = min(PRINCIPAL_CACHE_TTL, payload["exp"] - time.time()) if "exp" in payload else PRINCIPAL_CACHE_TTL
+    if ttl > 0:
+        principal_cache.set(username, {c.key: getattr(user, c.key) for c in User.__table__.columns}, ttl=ttl)
     return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+    return await _load_user(decode_token(token), db)
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    """For routes that only need the caller's id: answered from the token's
+    user_id claim and the principal cache, so a deleted user is rejected without
+    a users lookup on every request."""
+    return await principal_from_token(token, db)
+
+
+async def principal_from_token(token: str, db: AsyncSession) -> Principal:
+    payload = decode_token(token)
+    cached = principal_cache.get(payload["sub"])
+    if "user_id" in payload and cached is not None and cached["id"] == payload["user_id"]:
+        return Principal(id=payload["user_id"], username=payload["sub"])
+    # Not cached: confirm the user still exists (and cache it) before trusting the claim
+    user = await _load_user(payload, db)
+    if payload.get("user_id", user.id) != user.id:
+        # The username now belongs to a different account
+        raise credentials_exception()
+    return Principal(id=user.id, username=user.username)
@@ -0,0 +1,145 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from models import Friendship
+
+# Adjacency index of accepted friendships: one sorted array of friend ids per user,
+# loaded from the database the first time a user is touched and patched in place
+# when this worker accepts a request or unfriends. Entries expire after `ttl` so
+# changes made through other workers show up eventually.
+
+FRIEND_GRAPH_TTL = 300
+# Friends whose own friend lists are expanded when looking for suggestions
+SUGGESTION_EXPANSION = 200
+SUGGESTION_LIMIT = 10
+LOAD_CHUNK = 500
+
+
+def canonical_pair(user_id: int, other_id: int):
+    """Friendships are stored once per pair, smaller user id first."""
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+
+async def get_friendship(db: AsyncSession, user_id: int, other_id: int) -> Optional[Friendship]:
+    """The row between two users whatever its status; one probe of uq_friendships_pair."""
+    user1_id, user2_id = canonical_pair(user_id, other_id)
+    result = await db.execute(select(Friendship).filter_by(user1_id=user1_id, user2_id=user2_id))
+    return result.scalars().first()
+
+
+def intersection_size(a: array, b: array) -> int:
+    """Size of the intersection of two sorted arrays, by a linear merge."""
+    i = j = count = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            count += 1
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return count
+
+
+def contains(neighbors: array, user_id: int) -> bool:
+    index = bisect_left(neighbors, user_id)
+    return index < len(neighbors) and neighbors[index] == user_id
+
+
+class FriendGraph:
+    def __init__(self, maxsize: int = 100000, ttl: float = FRIEND_GRAPH_TTL):
+        self._adjacency = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def set_neighbors(self, user_id: int, friend_ids: Iterable[int]):
+        self._adjacency.set(user_id, array("q", sorted(set(friend_ids))))
+
+    async def _load(self, db: AsyncSession, user_ids: List[int]):
+        for start in range(0, len(user_ids), LOAD_CHUNK):
+            chunk = user_ids[start:start + LOAD_CHUNK]
+            result = await db.execute(select(Friendship.user1_id, Friendship.user2_id).filter(
+                Friendship.status == "accepted",
+                or_(Friendship.user1_id.in_(chunk), Friendship.user2_id.in_(chunk)),
+            ))
+            friends = {user_id: [] for user_id in chunk}
+            for user1, user2 in result.all():
+                if user1 in friends:
+                    friends[user1].append(user2)
+                if user2 in friends:
+                    friends[user2].append(user1)
+            for user_id, ids in friends.items():
+                self.set_neighbors(user_id, ids)
+
+    async def neighbors_many(self, db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, array]:
+        """Friend lists for several users, loading every missing one in a single query per chunk."""
+        found, missing = {}, []
+        for user_id in user_ids:
+            neighbors = self._adjacency.get(user_id)
+            if neighbors is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = neighbors
+        if missing:
+            await self._load(db, missing)
+            for user_id in missing:
+                neighbors = self._adjacency.get(user_id)
+                # Evicted straight away by a tiny cache: still answer from what was loaded
+                found[user_id] = neighbors if neighbors is not None else array("q")
+        return found
+
+    async def neighbors(self, db: AsyncSession, user_id: int) -> array:
+        return (await self.neighbors_many(db, [user_id]))[user_id]
+
+    def _patch(self, user_id: int, friend_id: int, add: bool):
+        neighbors = self._adjacency.get(user_id)
+        if neighbors is None:
+            return
+        index = bisect_left(neighbors, friend_id)
+        present = index < len(neighbors) and neighbors[index] == friend_id
+        if add and not present:
+            neighbors.insert(index, friend_id)
+        elif not add and present:
+            del neighbors[index]
+
+    def add_edge(self, user1_id: int, user2_id: int):
+        self._patch(user1_id, user2_id, add=True)
+        self._patch(user2_id, user1_id, add=True)
+
+    def remove_edge(self, user1_id: int, user2_id: int):
+        self._patch(user1_id, user2_id, add=False)
+        self._patch(user2_id, user1_id, add=False)
+
+    async def mutual_count(self, db: AsyncSession, user_id: int, other_id: int) -> int:
+        lists = await self.neighbors_many(db, [user_id, other_id])
+        return intersection_size(lists[user_id], lists[other_id])
+
+    async def suggestions(self, db: AsyncSession, user_id: int, limit: int = SUGGESTION_LIMIT,
+                          expansion: Optional[int] = SUGGESTION_EXPANSION):
+        """Friends of friends ranked by mutual-friend count, as (user_id, mutual_count).
+
+        A two-hop BFS that expands at most `expansion` of the user's friends, so a
+        user with thousands of friends costs a bounded number of list reads.
+        """
+        friends = await self.neighbors(db, user_id)
+        expanded = list(friends[:expansion]) if expansion is not None else list(friends)
+        lists = await self.neighbors_many(db, expanded)
+        mutuals = Counter()
+        for friend_id in expanded:
+            for candidate in lists[friend_id]:
+                if candidate != user_id and not contains(friends, candidate):
+                    mutuals[candidate] += 1
+        return heapq.nsmallest(limit, ((candidate, count) for candidate, count in mutuals.items()),
+                               key=lambda item: (-item[1], item[0]))
+
+    def stats(self) -> dict:
+        return self._adjacency.stats()
+
+
+friend_graph = FriendGraph()
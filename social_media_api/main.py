@@ -1,197 +1,485 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from models import User, Post, Like, Comment, Notification, Friendship
-from database import Base, engine
-from schemas import UserCreate, UserLogin, Token, PostCreate, CommentCreate
-from dependencies import get_current_user, get_db
+from database import Base, engine, async_engine
+from instrumentation import SQLInstrumentationMiddleware
+from schemas import MAX_ID, UserCreate, UserLogin, Token, PostCreate, CommentCreate, FeedPage, PostOut, PostStats, CommentPage, SearchPage, NotificationPage, NotificationSelection
+from dependencies import Principal, get_current_principal, get_current_user, get_db, principal_from_token, revoke_user
+from passwords import password_hasher
+import timeline
+import posts
+import trending
+import search
+from friend_graph import SUGGESTION_LIMIT, canonical_pair, friend_graph, get_friendship
+from counters import counter_buffer
+import cleanup
+from cleanup import purger
+import notifications
+from notifications import HEARTBEAT_SECONDS, notification_bus, notification_writer, notify
 
-from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
 from fastapi.openapi.utils import get_openapi
 
 app = FastAPI(title="Social Media API")
+app.add_middleware(SQLInstrumentationMiddleware)
 Base.metadata.create_all(bind=engine)
+with engine.begin() as connection:
+    search.create_index(connection)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@app.on_event("shutdown")
+async def shutdown():
+    password_hasher.shutdown()
+    counter_buffer.shutdown()
+    notification_writer.shutdown()
+    await async_engine.dispose()
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Put a user_id claim in issued tokens so routes that only need the caller's id
+# never touch the users table.
+TOKEN_USER_CLAIMS = True
 
-def create_access_token(data: dict, expires_delta: timedelta = None):
+def create_access_token(data: dict, expires_delta: timedelta = None, user: User = None):
     to_encode = data.copy()
+    if user is not None and TOKEN_USER_CLAIMS:
+        to_encode.update({"user_id": user.id})
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    # Fractional iat, so a token issued right after an account deletion is told apart from one before it
+    to_encode.update({"exp": expire, "iat": time.time()})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 @app.post("/signup")
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    hashed_password = pwd_context.hash(user.password)
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return {"message": "User registered successfully"}
 
 @app.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).filter(User.email == user.email))
+    db_user = result.scalars().first()
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token(data={"sub": db_user.username})
+    token = create_access_token(data={"sub": db_user.username}, user=db_user)
+    if new_hash:
+        # Stored hash uses outdated settings: replace it now that we know the password
+        db_user.hashed_password = new_hash
+        await db.commit()
     return {"access_token": token, "token_type": "bearer"}
 
 @app.get("/users/me")
-def get_current_user_profile(user: User = Depends(get_current_user)):
+async def get_current_user_profile(user: User = Depends(get_current_user)):
     return user
 
+@app.delete("/users/me", status_code=status.HTTP_202_ACCEPTED)
+async def delete_account(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    """Unfriends everyone straight away; posts, likes, comments, notifications and
+    finally the user row are deleted in the background. The caller's tokens stop
+    working immediately."""
+    revoke_user(user.id, user.username)
+    result = await db.execute(select(Friendship).filter(
+        or_(Friendship.user1_id == user.id, Friendship.user2_id == user.id)
+    ))
+    friendships = result.scalars().all()
+    await db.execute(delete(Friendship).filter(Friendship.id.in_([f.id for f in friendships])))
+    await db.commit()
+    friends = [f.user2_id if f.user1_id == user.id else f.user1_id for f in friendships if f.status == "accepted"]
+    for friend_id in friends:
+        friend_graph.remove_edge(user.id, friend_id)
+    await timeline.friendship_changed(db, user.id, *friends)
+    purger.purge_user(user.id, user.username)
+    return {"message": "Account deletion scheduled"}
+
 @app.post("/posts")
-def create_post(post: PostCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post(post: PostCreate, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     db_post = Post(user_id=user.id, **post.dict())
     db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    await db.commit()
+    await db.refresh(db_post)
+    await timeline.fan_out_post(db, db_post)
+    trending.record_post(db_post.content)
     return db_post
 
 @app.get("/posts")
-def get_user_posts(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Post).filter(Post.user_id == user.id).all()
+async def get_user_posts(
+    ids: Optional[str] = Query(None, regex=r"^\d{1,19}(,\d{1,19})*$", description="Comma-separated post ids; defaults to your own posts"),
+    include: Optional[str] = Query(None, description="Comma-separated: " + ",".join(posts.INCLUDES)),
+    user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    fields = set(include.split(",")) if include else set()
+    if not fields <= set(posts.INCLUDES):
+        raise HTTPException(status_code=400, detail=f"include accepts {', '.join(posts.INCLUDES)}")
+    if ids is None:
+        result = await db.execute(select(Post).filter(Post.user_id == user.id))
+        items = [posts.snapshot(post) for post in result.scalars()]
+    else:
+        post_ids = list(dict.fromkeys(int(post_id) for post_id in ids.split(",")))
+        if max(post_ids) > MAX_ID:
+            raise HTTPException(status_code=400, detail="Post id out of range")
+        if len(post_ids) > posts.MAX_MULTI_GET:
+            raise HTTPException(status_code=400, detail=f"At most {posts.MAX_MULTI_GET} ids per request")
+        items = await posts.get_cached_posts(db, post_ids)
+    return await posts.embed(db, items, fields) if fields else items
+
+@app.get("/feed", response_model=FeedPage)
+async def get_feed(
+    cursor: Optional[int] = Query(None, ge=0, le=MAX_ID, description="next_cursor from the previous page"),
+    limit: int = Query(timeline.FEED_PAGE_SIZE, ge=1, le=timeline.MAX_FEED_PAGE_SIZE),
+    user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    items, next_cursor = await timeline.get_feed(db, user.id, before=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/search/posts", response_model=SearchPage)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(search.SEARCH_PAGE_SIZE, ge=1, le=search.MAX_SEARCH_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        after = search.parse_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    post_ids, next_cursor = await search.search_posts(db, q, after, limit)
+    return {"items": await posts.get_cached_posts(db, post_ids), "next_cursor": next_cursor}
+
+@app.get("/trending")
+async def get_trending(limit: int = Query(10, ge=1, le=trending.TOP_K)):
+    """Most active posts (likes and comments) and hashtags over the last window; estimates, per worker."""
+    return {
+        "window_seconds": trending.TRENDING_WINDOW_SECONDS,
+        "posts": [{"post_id": post_id, "score": score} for post_id, score in trending.post_activity.top(limit)],
+        "hashtags": [{"tag": tag, "count": count} for tag, count in trending.hashtag_activity.top(limit)],
+    }
+
+@app.get("/posts/cache-stats")
+async def get_post_cache_stats():
+    return posts.cache_stats()
 
-@app.get("/posts/{post_id}")
-def get_post(post_id: int, db: Session = Depends(get_db)):
-    post = db.query(Post).get(post_id)
+@app.get("/posts/{post_id}", response_model=PostOut)
+async def get_post(post_id: int, db: AsyncSession = Depends(get_db)):
+    post = await posts.get_cached_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     return post
 
+@app.get("/posts/{post_id}/stats", response_model=PostStats)
+async def get_post_stats(post_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Post.like_count, Post.comment_count).filter(Post.id == post_id))
+    counts = result.first()
+    if not counts:
+        raise HTTPException(status_code=404, detail="Post not found")
+    # Add deltas this worker has not flushed yet
+    likes, comments = counter_buffer.pending(post_id)
+    return {"post_id": post_id, "like_count": counts.like_count + likes, "comment_count": counts.comment_count + comments}
+
 @app.put("/posts/{post_id}")
-def update_post(post_id: int, post: PostCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_post = db.query(Post).get(post_id)
+async def update_post(post_id: int, post: PostCreate, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    db_post = await db.get(Post, post_id)
     if not db_post or db_post.user_id != user.id:
         raise HTTPException(status_code=403, detail="Permission denied")
     for key, value in post.dict().items():
         setattr(db_post, key, value)
-    db.commit()
+    await db.commit()
+    # The flush already invalidated; this drops anything a concurrent reader cached before our commit
+    posts.invalidate_post(post_id)
     return db_post
 
 @app.delete("/posts/{post_id}")
-def delete_post(post_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_post = db.query(Post).get(post_id)
+async def delete_post(post_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    db_post = await db.get(Post, post_id)
     if not db_post or db_post.user_id != user.id:
         raise HTTPException(status_code=403, detail="Permission denied")
-    db.delete(db_post)
-    db.commit()
+    likes, comments = counter_buffer.pending(post_id)
+    if db_post.like_count + likes + db_post.comment_count + comments > cleanup.INLINE_PURGE_LIMIT:
+        # Too many likes/comments for one transaction; the post goes once they are gone
+        purger.purge_post(post_id)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"message": "Post deletion scheduled"})
+    await cleanup.delete_post_inline(db, post_id)
+    await db.commit()
+    posts.invalidate_post(post_id)
+    trending.forget_posts([post_id])
     return {"message": "Post deleted"}
 
+async def notify_post_owner(db: AsyncSession, post_id: int, user: Principal, event_type: str, message: str):
+    owner_id = await db.scalar(select(Post.user_id).filter(Post.id == post_id))
+    if owner_id is not None and owner_id != user.id:
+        notify(owner_id, event_type, message, post_id=post_id, actor_id=user.id)
+
 @app.post("/like")
-def like_post(post_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    like = Like(user_id=user.id, post_id=post_id)
-    db.add(like)
-    db.commit()
+async def like_post(post_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    owner_id = await db.scalar(select(Post.user_id).filter(Post.id == post_id))
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    db.add(Like(user_id=user.id, post_id=post_id))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # Only uq_likes_user_post means "already liked"; e.g. the post deleted meanwhile is an error
+        if await db.scalar(select(Like.id).filter_by(user_id=user.id, post_id=post_id)) is None:
+            raise
+    else:
+        counter_buffer.add(post_id, likes=1)
+        trending.record_like(post_id)
+        if owner_id != user.id:
+            notify(owner_id, "like", f"{user.username} liked your post", post_id=post_id, actor_id=user.id)
     return {"message": "Post liked"}
 
 @app.delete("/like/{post_id}")
-def unlike_post(post_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_like = db.query(Like).filter_by(user_id=user.id, post_id=post_id).first()
+async def unlike_post(post_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Like).filter_by(user_id=user.id, post_id=post_id))
+    db_like = result.scalars().first()
     if db_like:
-        db.delete(db_like)
-        db.commit()
+        await db.delete(db_like)
+        await db.commit()
+        counter_buffer.add(post_id, likes=-1)
     return {"message": "Unliked"}
 
 @app.get("/likes/{post_id}")
-def get_post_likes(post_id: int, db: Session = Depends(get_db)):
-    return db.query(Like).filter_by(post_id=post_id).all()
+async def get_post_likes(post_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Like).filter_by(post_id=post_id))
+    return result.scalars().all()
 
 @app.post("/comment")
-def comment_on_post(post_id: int, comment: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def comment_on_post(post_id: int, comment: str, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     db_comment = Comment(user_id=user.id, post_id=post_id, comment=comment)
     db.add(db_comment)
-    db.commit()
+    await db.commit()
+    counter_buffer.add(post_id, comments=1)
+    trending.record_comment(post_id)
+    await notify_post_owner(db, post_id, user, "comment", f"{user.username} commented on your post")
     return db_comment
 
-@app.get("/comments/{post_id}")
-def get_post_comments(post_id: int, db: Session = Depends(get_db)):
-    return db.query(Comment).filter_by(post_id=post_id).all()
+@app.get("/comments/{post_id}", response_model=CommentPage)
+async def get_post_comments(
+    post_id: int,
+    cursor: Optional[int] = Query(None, ge=0, le=MAX_ID, description="next_cursor from the previous page"),
+    limit: int = Query(posts.COMMENT_PAGE_SIZE, ge=1, le=posts.MAX_COMMENT_PAGE_SIZE),
+    order: str = Query("newest", regex="^(newest|oldest)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    items, next_cursor = await posts.get_comments(db, post_id, cursor, limit, newest_first=order == "newest")
+    return {"items": items, "next_cursor": next_cursor}
 
 @app.put("/comment/{comment_id}")
-def edit_comment(comment_id: int, comment_data: CommentCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    comment = db.query(Comment).get(comment_id)
+async def edit_comment(comment_id: int, comment_data: CommentCreate, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    comment = await db.get(Comment, comment_id)
     if not comment or comment.user_id != user.id:
         raise HTTPException(status_code=403, detail="Permission denied")
     comment.comment = comment_data.comment
-    db.commit()
+    await db.commit()
     return comment
 
 @app.delete("/comment/{comment_id}")
-def delete_comment(comment_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    comment = db.query(Comment).get(comment_id)
+async def delete_comment(comment_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    comment = await db.get(Comment, comment_id)
     if not comment or comment.user_id != user.id:
         raise HTTPException(status_code=403, detail="Permission denied")
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.commit()
+    counter_buffer.add(comment.post_id, comments=-1)
     return {"message": "Comment deleted"}
 
-@app.get("/notifications")
-def get_notifications(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Notification).filter_by(user_id=user.id).all()
+@app.get("/notifications", response_model=NotificationPage)
+async def get_notifications(
+    cursor: Optional[int] = Query(None, ge=0, le=MAX_ID, description="next_cursor from the previous page"),
+    limit: int = Query(notifications.NOTIFICATION_PAGE_SIZE, ge=1, le=notifications.MAX_NOTIFICATION_PAGE_SIZE),
+    unread_only: bool = False,
+    user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    items, next_cursor = await notifications.get_notifications(db, user.id, cursor, limit, unread_only)
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/notifications/unread-count")
+async def get_unread_count(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return {"unread": await notifications.unread_count(db, user.id)}
+
+@app.post("/notifications/read")
+async def mark_notifications_read(selection: NotificationSelection, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return {"updated": await notifications.mark_read(db, user.id, selection.ids, selection.before_id)}
+
+@app.post("/notifications/delete")
+async def delete_notifications(selection: NotificationSelection, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return {"deleted": await notifications.delete_notifications(db, user.id, selection.ids, selection.before_id)}
+
+def sse_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.get("/notifications/stream")
+async def stream_notifications(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    """Server-sent events: one `event:`/`data:` pair per notification as it happens."""
+    # Don't pin a pooled connection for the lifetime of the stream
+    await db.close()
+    queue = notification_bus.subscribe(user.id)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event)
+        finally:
+            notification_bus.unsubscribe(user.id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/ws/notifications")
+async def notifications_socket(websocket: WebSocket, token: str, db: AsyncSession = Depends(get_db)):
+    """Pushes each notification as a JSON message; browsers can't set headers on
+    a WebSocket, so the bearer token comes as a query parameter."""
+    try:
+        user = await principal_from_token(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        await db.close()
+    await websocket.accept()
+    queue = notification_bus.subscribe(user.id)
+
+    async def send_events():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    sender = asyncio.create_task(send_events())
+    try:
+        while True:
+            # Nothing is expected from the client; this just notices when it leaves
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        notification_bus.unsubscribe(user.id, queue)
 
 @app.put("/notifications/{notification_id}/read")
-def mark_notification_read(notification_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notif = db.query(Notification).get(notification_id)
-    if notif and notif.user_id == user.id:
-        notif.is_read = True
-        db.commit()
+async def mark_notification_read(notification_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    await notifications.mark_read(db, user.id, ids=[notification_id])
     return {"message": "Marked as read"}
 
 @app.delete("/notifications/{notification_id}")
-def delete_notification(notification_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notif = db.query(Notification).get(notification_id)
-    if notif and notif.user_id == user.id:
-        db.delete(notif)
-        db.commit()
+async def delete_notification(notification_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    await notifications.delete_notifications(db, user.id, ids=[notification_id])
     return {"message": "Notification deleted"}
 
 @app.post("/friend-request")
-def send_friend_request(friend_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_request = Friendship(user1_id=user.id, user2_id=friend_id, status="pending")
+async def send_friend_request(friend_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    if friend_id == user.id:
+        raise HTTPException(status_code=400, detail="Cannot send a friend request to yourself")
+    if await db.get(User, friend_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user1_id, user2_id = canonical_pair(user.id, friend_id)
+    db_request = Friendship(user1_id=user1_id, user2_id=user2_id, requester_id=user.id, status="pending")
     db.add(db_request)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # uq_friendships_pair: either side already asked; only a rejected request can be renewed
+        await db.rollback()
+        db_request = await get_friendship(db, user.id, friend_id)
+        if db_request is None:
+            # Not the pair constraint (e.g. the user was deleted meanwhile)
+            raise
+        if db_request.status != "rejected":
+            raise HTTPException(status_code=400, detail="Friend request already exists")
+        db_request.status = "pending"
+        db_request.requester_id = user.id
+        await db.commit()
+    notify(friend_id, "friend_request", f"{user.username} sent you a friend request",
+           request_id=db_request.id, actor_id=user.id)
     return {"message": "Friend request sent"}
 
 @app.get("/friend-requests")
-def get_friend_requests(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Friendship).filter_by(user2_id=user.id, status="pending").all()
+async def get_friend_requests(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Friendship).filter(
+        or_(Friendship.user1_id == user.id, Friendship.user2_id == user.id),
+        Friendship.status == "pending",
+        Friendship.requester_id != user.id,
+    ))
+    return result.scalars().all()
 
-@app.post("/accept-friend-request")
-def accept_friend_request(request_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    req = db.query(Friendship).get(request_id)
-    if not req or req.user2_id != user.id:
+async def get_incoming_request(db: AsyncSession, request_id: int, user: Principal) -> Friendship:
+    req = await db.get(Friendship, request_id)
+    if not req or user.id not in (req.user1_id, req.user2_id) or req.requester_id == user.id:
         raise HTTPException(status_code=403, detail="Permission denied")
+    return req
+
+@app.post("/accept-friend-request")
+async def accept_friend_request(request_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    req = await get_incoming_request(db, request_id, user)
     req.status = "accepted"
-    db.commit()
+    await db.commit()
+    friend_graph.add_edge(req.user1_id, req.user2_id)
+    await timeline.friendship_changed(db, req.user1_id, req.user2_id)
+    notify(req.requester_id, "friend_accept", f"{user.username} accepted your friend request",
+           request_id=req.id, actor_id=user.id)
     return {"message": "Friend request accepted"}
 
 @app.post("/reject-friend-request")
-def reject_friend_request(request_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    req = db.query(Friendship).get(request_id)
-    if not req or req.user2_id != user.id:
-        raise HTTPException(status_code=403, detail="Permission denied")
+async def reject_friend_request(request_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    req = await get_incoming_request(db, request_id, user)
     req.status = "rejected"
-    db.commit()
+    await db.commit()
     return {"message": "Friend request rejected"}
 
+@app.get("/friends", response_model=List[int])
+async def get_friends(user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return list(await friend_graph.neighbors(db, user.id))
+
+@app.get("/friends/suggestions")
+async def get_friend_suggestions(
+    limit: int = Query(SUGGESTION_LIMIT, ge=1, le=100),
+    user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    suggestions = await friend_graph.suggestions(db, user.id, limit)
+    return [{"user_id": user_id, "mutual_friends": count} for user_id, count in suggestions]
+
+@app.get("/friends/{other_id}/status")
+async def get_friendship_status(other_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    friendship = await get_friendship(db, user.id, other_id)
+    return {
+        "user_id": other_id,
+        "status": friendship.status if friendship else None,
+        "requester_id": friendship.requester_id if friendship else None,
+    }
+
+@app.get("/friends/{other_id}/mutual")
+async def get_mutual_friends(other_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return {"user_id": other_id, "mutual_friends": await friend_graph.mutual_count(db, user.id, other_id)}
+
 @app.delete("/friends/{friend_id}")
-def unfriend(friend_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    friendship = db.query(Friendship).filter(
-        ((Friendship.user1_id == user.id) & (Friendship.user2_id == friend_id)) |
-        ((Friendship.user1_id == friend_id) & (Friendship.user2_id == user.id))
-    ).first()
+async def unfriend(friend_id: int, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    friendship = await get_friendship(db, user.id, friend_id)
     if friendship:
-        db.delete(friendship)
-        db.commit()
+        await db.delete(friendship)
+        await db.commit()
+        friend_graph.remove_edge(friendship.user1_id, friendship.user2_id)
+        await timeline.friendship_changed(db, user.id, friend_id)
     return {"message": "Unfriended"}
 
 def custom_openapi():
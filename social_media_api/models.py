@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -9,6 +9,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
+    # Maintained alongside notification writes, read-state changes and deletes
+    unread_notifications = Column(Integer, nullable=False, default=0, server_default="0")
 
 class Post(Base):
     __tablename__ = "posts"
@@ -16,30 +18,45 @@ class Post(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     content = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Denormalized from likes/comments, maintained through counters.counter_buffer
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
 class Like(Base):
     __tablename__ = "likes"
+    # One like per user per post; post_id alone serves get_post_likes
+    __table_args__ = (Index("uq_likes_user_post", "user_id", "post_id", unique=True),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    post_id = Column(Integer, ForeignKey("posts.id"))
+    post_id = Column(Integer, ForeignKey("posts.id"), index=True)
 
 class Comment(Base):
     __tablename__ = "comments"
+    # A post's comments in id order: every page of GET /comments/{post_id} is one range scan
+    __table_args__ = (Index("ix_comments_post_id_id", "post_id", "id"),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     post_id = Column(Integer, ForeignKey("posts.id"))
     comment = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class Notification(Base):
     __tablename__ = "notifications"
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     message = Column(String)
     is_read = Column(Boolean, default=False)
 
 class Friendship(Base):
     __tablename__ = "friendships"
+    # Each pair is stored once as (smaller id, larger id), see friend_graph.canonical_pair;
+    # user2_id + status serves the other end of get_friend_requests
+    __table_args__ = (
+        Index("uq_friendships_pair", "user1_id", "user2_id", unique=True),
+        Index("ix_friendships_user2_status", "user2_id", "status"),
+    )
     id = Column(Integer, primary_key=True)
     user1_id = Column(Integer, ForeignKey("users.id"))
     user2_id = Column(Integer, ForeignKey("users.id"))
+    requester_id = Column(Integer, ForeignKey("users.id"))
     status = Column(String)  # 'pending', 'accepted', 'rejected'
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import List, Optional
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from batching import BatchWriter
+from database import engine
+from models import Notification, User
+
+# Notifications are published to an in-process bus and pushed to the recipient's
+# open WebSocket/SSE connections straight away; the Notification rows behind
+# GET /notifications are written in batches every NOTIFICATION_FLUSH_MS.
+NOTIFICATION_FLUSH_MS = int(os.getenv("NOTIFICATION_FLUSH_MS", "200"))
+# Events a slow connection may fall behind by before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+# Idle SSE connections get a comment line this often so proxies keep them open
+HEARTBEAT_SECONDS = 15
+NOTIFICATION_PAGE_SIZE = 50
+MAX_NOTIFICATION_PAGE_SIZE = 200
+
+users = User.__table__
+
+ADD_UNREAD = update(users).where(users.c.id == bindparam("recipient")).values(
+    unread_notifications=users.c.unread_notifications + bindparam("added"),
+)
+
+
+class NotificationBus:
+    """Fan-out of events to each user's live connections.
+
+    A connection is an asyncio.Queue plus the loop it is read on; publishers may
+    run on any thread or loop and hand events over with call_soon_threadsafe, so
+    an idle connection costs a queue, not a thread.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id: int, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        self.published += 1
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Loop already closed; its connection is going away
+                pass
+
+    def _offer(self, queue: asyncio.Queue, event: dict):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(event)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._subscribers),
+                "connections": sum(len(subscribers) for subscribers in self._subscribers.values()),
+                "published": self.published,
+                "dropped": self.dropped,
+            }
+
+
+class NotificationWriter(BatchWriter):
+    """Persists notifications with one multi-row INSERT per flush."""
+
+    name = "notification-flush"
+
+    def __init__(self, bind, interval_ms: int = NOTIFICATION_FLUSH_MS):
+        super().__init__(bind, interval_ms)
+
+    def _empty(self):
+        return []
+
+    def add(self, user_id: int, message: str):
+        with self._lock:
+            self._pending.append({"user_id": user_id, "message": message, "is_read": False})
+        self._added()
+
+    def pending(self, user_id: int) -> int:
+        with self._lock:
+            return sum(1 for row in self._pending + self._inflight if row["user_id"] == user_id)
+
+    def _write(self, connection, batch) -> int:
+        connection.execute(insert(Notification.__table__), batch)
+        added = Counter(row["user_id"] for row in batch)
+        connection.execute(ADD_UNREAD, [{"recipient": user_id, "added": n} for user_id, n in added.items()])
+        return len(batch)
+
+    def _requeue(self, batch):
+        self._pending[:0] = batch
+
+
+notification_bus = NotificationBus()
+notification_writer = NotificationWriter(engine)
+
+
+def notify(user_id: int, event_type: str, message: str, **data):
+    """Deliver an event to the user's live connections and queue it for storage."""
+    notification_bus.publish(user_id, {"type": event_type, "message": message, **data})
+    notification_writer.add(user_id, message)
+
+
+def _selection(user_id: int, ids: Optional[List[int]], before_id: Optional[int]):
+    criteria = [Notification.user_id == user_id]
+    if ids is not None:
+        criteria.append(Notification.id.in_(ids))
+    if before_id is not None:
+        criteria.append(Notification.id < before_id)
+    return criteria
+
+
+async def get_notifications(db: AsyncSession, user_id: int, before: Optional[int] = None,
+                            limit: int = NOTIFICATION_PAGE_SIZE, unread_only: bool = False):
+    """Newest first, strictly older than id `before`. Returns (items, next_cursor)."""
+    query = select(Notification).filter(*_selection(user_id, None, before))
+    if unread_only:
+        query = query.filter(Notification.is_read == False)  # noqa: E712
+    result = await db.execute(query.order_by(Notification.id.desc()).limit(limit + 1))
+    items = result.scalars().all()
+    next_cursor = items[limit - 1].id if len(items) > limit else None
+    return items[:limit], next_cursor
+
+
+async def unread_count(db: AsyncSession, user_id: int) -> int:
+    stored = await db.scalar(select(User.unread_notifications).filter(User.id == user_id))
+    return (stored or 0) + notification_writer.pending(user_id)
+
+
+async def _mark_read(db: AsyncSession, user_id: int, criteria) -> int:
+    """Mark matching unread notifications read and take them off the counter.
+
+    Runs inside the caller's transaction; returns how many changed."""
+    result = await db.execute(
+        update(Notification).filter(*criteria, Notification.is_read == False)  # noqa: E712
+        .values(is_read=True).execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        await db.execute(update(User).filter(User.id == user_id).values(
+            unread_notifications=User.unread_notifications - result.rowcount,
+        ).execution_options(synchronize_session=False))
+    return result.rowcount
+
+
+async def mark_read(db: AsyncSession, user_id: int, ids: Optional[List[int]] = None,
+                    before_id: Optional[int] = None) -> int:
+    """One UPDATE for every selected notification; returns how many changed."""
+    try:
+        changed = await _mark_read(db, user_id, _selection(user_id, ids, before_id))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return changed
+
+
+async def delete_notifications(db: AsyncSession, user_id: int, ids: Optional[List[int]] = None,
+                               before_id: Optional[int] = None) -> int:
+    """One DELETE for every selected notification; returns how many were removed."""
+    criteria = _selection(user_id, ids, before_id)
+    try:
+        # Flip unread ones first so the counter drops by exactly what disappears
+        await _mark_read(db, user_id, criteria)
+        result = await db.execute(delete(Notification).filter(*criteria).execution_options(synchronize_session=False))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return result.rowcount
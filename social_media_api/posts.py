@@ -0,0 +1,200 @@
+import asyncio
+import sys
+from typing import List, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from counters import counter_buffer
+from models import Comment, Post
+
+# Read-through cache for GET /posts/{post_id}. Entries are plain column dicts,
+# never ORM objects, so they can be shared between requests and sessions. The
+# like/comment counts in them may trail GET /posts/{id}/stats by up to the TTL.
+post_cache = TTLCache(maxsize=10000, ttl=60)
+
+MAX_MULTI_GET = 100
+INCLUDES = ("like_count", "comment_count", "recent_comments")
+RECENT_COMMENTS = 3
+COMMENT_PAGE_SIZE = 20
+MAX_COMMENT_PAGE_SIZE = 100
+
+
+class _LeaderCancelled(Exception):
+    """The caller running a shared load was cancelled; a waiter takes the load over."""
+
+
+class SingleFlight:
+    """Collapses concurrent loads of the same key into one: the first caller runs
+    the loader, callers arriving while it is in flight await its result. If that
+    caller is cancelled (e.g. its client disconnected), one waiter runs its own
+    loader instead and the rest wait on it."""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, loader):
+        loop = asyncio.get_running_loop()
+        while True:
+            call = self._calls.get(key)
+            if call is None or call.get_loop() is not loop:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(call)
+            except _LeaderCancelled:
+                continue
+        call = self._calls[key] = loop.create_future()
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            # Cancellation belongs to this caller only; the loader is tied to its session
+            call.set_exception(_LeaderCancelled())
+            call.exception()
+            raise
+        except BaseException as exc:
+            call.set_exception(exc)
+            call.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+
+post_loads = SingleFlight()
+# Bumped on every invalidation so a load that raced with a write doesn't cache the old row
+_invalidations = 0
+
+
+def snapshot(post: Post) -> dict:
+    return {column.key: getattr(post, column.key) for column in Post.__table__.columns}
+
+
+def invalidate_post(post_id: int):
+    global _invalidations
+    _invalidations += 1
+    post_cache.delete(post_id)
+
+
+@event.listens_for(Post, "after_update")
+@event.listens_for(Post, "after_delete")
+def _invalidate_changed_post(mapper, connection, target):
+    invalidate_post(target.id)
+
+
+async def get_cached_post(db: AsyncSession, post_id: int):
+    """Post dict for `post_id`, or None; a cold key hit by many requests at once is loaded once."""
+    cached = post_cache.get(post_id)
+    if cached is not None:
+        return cached
+
+    async def load():
+        invalidations = _invalidations
+        post = await db.get(Post, post_id)
+        if post is None:
+            return None
+        loaded = snapshot(post)
+        if invalidations == _invalidations:
+            post_cache.set(post_id, loaded)
+        return loaded
+
+    return await post_loads.do(post_id, load)
+
+
+async def get_cached_posts(db: AsyncSession, post_ids: List[int]) -> List[dict]:
+    """Post dicts in the order of `post_ids`, skipping unknown ids; misses are filled with one IN query."""
+    found, missing = {}, []
+    for post_id in post_ids:
+        cached = post_cache.get(post_id)
+        if cached is not None:
+            found[post_id] = cached
+        else:
+            missing.append(post_id)
+    if missing:
+        invalidations = _invalidations
+        result = await db.execute(select(Post).filter(Post.id.in_(missing)))
+        for post in result.scalars():
+            found[post.id] = snapshot(post)
+            if invalidations == _invalidations:
+                post_cache.set(post.id, found[post.id])
+    return [found[post_id] for post_id in post_ids if post_id in found]
+
+
+async def embed(db: AsyncSession, items: List[dict], include) -> List[dict]:
+    """Copies of `items` with the requested aggregates attached.
+
+    At most two queries whatever the number of posts: one IN for the counters
+    (read fresh, not from the cache) and one windowed query for recent comments.
+    """
+    items = [dict(item) for item in items]
+    post_ids = [item["id"] for item in items]
+    if not post_ids:
+        return items
+
+    if "like_count" in include or "comment_count" in include:
+        result = await db.execute(
+            select(Post.id, Post.like_count, Post.comment_count).filter(Post.id.in_(post_ids))
+        )
+        counts = {row.id: row for row in result}
+        for item in items:
+            row = counts.get(item["id"])
+            likes, comments = counter_buffer.pending(item["id"])
+            if "like_count" in include:
+                item["like_count"] = (row.like_count if row else 0) + likes
+            if "comment_count" in include:
+                item["comment_count"] = (row.comment_count if row else 0) + comments
+
+    if "recent_comments" in include:
+        position = func.row_number().over(partition_by=Comment.post_id, order_by=Comment.id.desc()).label("position")
+        ranked = select(Comment.id, Comment.post_id, Comment.user_id, Comment.comment, position).filter(
+            Comment.post_id.in_(post_ids)
+        ).subquery()
+        result = await db.execute(
+            select(ranked.c.id, ranked.c.post_id, ranked.c.user_id, ranked.c.comment)
+            .filter(ranked.c.position <= RECENT_COMMENTS).order_by(ranked.c.post_id, ranked.c.id.desc())
+        )
+        recent = {post_id: [] for post_id in post_ids}
+        for row in result:
+            recent[row.post_id].append({"id": row.id, "user_id": row.user_id, "comment": row.comment})
+        for item in items:
+            item["recent_comments"] = recent[item["id"]]
+    return items
+
+
+async def get_comments(db: AsyncSession, post_id: int, cursor: Optional[int] = None,
+                       limit: int = COMMENT_PAGE_SIZE, newest_first: bool = True):
+    """One page of a post's comments keyed on id, so page N costs the same as page 1.
+
+    `cursor` is the last id of the previous page; returns (comments, next_cursor).
+    """
+    query = select(Comment).filter(Comment.post_id == post_id)
+    if newest_first:
+        if cursor is not None:
+            query = query.filter(Comment.id < cursor)
+        query = query.order_by(Comment.id.desc())
+    else:
+        if cursor is not None:
+            query = query.filter(Comment.id > cursor)
+        query = query.order_by(Comment.id)
+    result = await db.execute(query.limit(limit + 1))
+    comments = result.scalars().all()
+    next_cursor = comments[limit - 1].id if len(comments) > limit else None
+    return comments[:limit], next_cursor
+
+
+def approximate_bytes(cache: TTLCache) -> int:
+    """Rough footprint of the cached dicts and their values (keys and LRU links excluded)."""
+    return sum(sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values()) for entry in cache.values())
+
+
+def cache_stats() -> dict:
+    return {
+        **post_cache.stats(),
+        "approx_bytes": approximate_bytes(post_cache),
+        "coalesced_loads": post_loads.coalesced,
+    }
@@ -1,4 +1,12 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, conint, conlist, root_validator
+
+# Largest id an INTEGER/BIGINT column holds; bigger client-supplied ids are rejected
+MAX_ID = 2 ** 63 - 1
+# Notification ids one mark-read/delete request may name
+MAX_NOTIFICATION_SELECTION = 1000
 
 class UserCreate(BaseModel):
     username: str
@@ -16,6 +24,68 @@ class Token(BaseModel):
 class PostCreate(BaseModel):
     content: str
 
+class PostOut(BaseModel):
+    id: int
+    user_id: int
+    content: str
+    created_at: datetime
+    like_count: int = 0
+    comment_count: int = 0
+
+    class Config:
+        orm_mode = True
+
+class SearchPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[str]
+
+class CommentOut(BaseModel):
+    id: int
+    user_id: int
+    post_id: int
+    comment: str
+    created_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+class CommentPage(BaseModel):
+    items: List[CommentOut]
+    next_cursor: Optional[int]
+
+class PostStats(BaseModel):
+    post_id: int
+    like_count: int
+    comment_count: int
+
+class FeedPage(BaseModel):
+    items: List[PostOut]
+    next_cursor: Optional[int]
+
 class CommentCreate(BaseModel):
     post_id: int
     comment: str
+
+class NotificationOut(BaseModel):
+    id: int
+    user_id: int
+    message: str
+    is_read: bool
+
+    class Config:
+        orm_mode = True
+
+class NotificationPage(BaseModel):
+    items: List[NotificationOut]
+    next_cursor: Optional[int]
+
+class NotificationSelection(BaseModel):
+    """Either explicit ids or every notification with id below before_id."""
+    ids: Optional[conlist(conint(ge=1, le=MAX_ID), max_items=MAX_NOTIFICATION_SELECTION)]
+    before_id: Optional[conint(ge=1, le=MAX_ID)]
+
+    @root_validator
+    def one_selector(cls, values):
+        if (values.get("ids") is None) == (values.get("before_id") is None):
+            raise ValueError("Give exactly one of ids or before_id")
+        return values
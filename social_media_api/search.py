@@ -0,0 +1,118 @@
+import base64
+import json
+import math
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Full-text search over Post.content.
+#
+# SQLite: an FTS5 table over posts (external content, so the text is not stored
+# twice) kept in step by triggers on insert, update and delete, which also covers
+# the bulk deletes in cleanup.py. PostgreSQL: a generated tsvector column with a
+# GIN index, which the database maintains on every write. Other backends fall back
+# to an unranked LIKE scan.
+#
+# Results are ordered by a score where lower is better (bm25 on SQLite, -ts_rank
+# on PostgreSQL), then post id; the cursor is the last (score, id) of a page,
+# encoded opaquely like the ecommerce product cursors.
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+TEXT_SEARCH_CONFIG = "english"
+MIN_INT64, MAX_INT64 = -2 ** 63, 2 ** 63 - 1
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(content, content='posts', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF content ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO posts_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+POSTGRESQL_INDEX = [
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+    f"(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(content, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING gin (search_vector)",
+]
+
+MATCHES = {
+    "sqlite": "SELECT rowid AS id, bm25(posts_fts) AS score FROM posts_fts WHERE posts_fts MATCH :query",
+    "postgresql": (
+        "SELECT id, -ts_rank(search_vector, query)::float8 AS score "
+        f"FROM posts, plainto_tsquery('{TEXT_SEARCH_CONFIG}', :query) query WHERE search_vector @@ query"
+    ),
+}
+FALLBACK_MATCH = "SELECT id, 0.0 AS score FROM posts WHERE lower(content) LIKE :query"
+
+
+def create_index(connection):
+    """Create the search index on this backend if it is missing; the SQLite one is
+    filled from the existing posts when it is first created."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'")).first()
+        for statement in SQLITE_INDEX:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for statement in POSTGRESQL_INDEX:
+            connection.execute(text(statement))
+
+
+def terms(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+
+def match_parameter(dialect: str, q: str) -> str:
+    if dialect == "sqlite":
+        # Each term quoted, so user input can't inject FTS5 query syntax; terms are ANDed
+        return " ".join(f'"{term}"' for term in terms(q))
+    if dialect == "postgresql":
+        return q
+    escaped = re.sub(r"([\\%_])", r"\\\1", q.lower())
+    return f"%{escaped}%"
+
+
+def encode_cursor(score: float, post_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"score": score, "id": post_id}).encode()).decode()
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """Decode a next_cursor; ValueError if it is malformed or out of range."""
+    if cursor is None:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        score, post_id = float(key["score"]), int(key["id"])
+    except (KeyError, TypeError, OverflowError) as exc:
+        raise ValueError(cursor) from exc
+    # Cursors come back from clients: keep them to what the columns can hold
+    if not math.isfinite(score) or not MIN_INT64 <= post_id <= MAX_INT64:
+        raise ValueError(cursor)
+    return score, post_id
+
+
+async def search_posts(db: AsyncSession, q: str, cursor: Optional[Tuple[float, int]] = None,
+                       limit: int = SEARCH_PAGE_SIZE):
+    """Ids of posts matching `q`, best first, after `cursor`. Returns (post_ids, next_cursor)."""
+    if not terms(q):
+        return [], None
+    dialect = db.bind.dialect.name
+    query = f"SELECT id, score FROM ({MATCHES.get(dialect, FALLBACK_MATCH)}) matches"
+    params = {"query": match_parameter(dialect, q), "limit": limit + 1}
+    if cursor is not None:
+        query += " WHERE score > :score OR (score = :score AND id > :id)"
+        params.update(score=cursor[0], id=cursor[1])
+    result = await db.execute(text(query + " ORDER BY score, id LIMIT :limit"), params)
+    rows = result.all()
+    next_cursor = encode_cursor(rows[limit - 1].score, rows[limit - 1].id) if len(rows) > limit else None
+    return [row.id for row in rows[:limit]], next_cursor
@@ -1,6 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
+from jose import jwt
 from main import app
+from dependencies import principal_cache, SECRET_KEY, ALGORITHM
+from counters import counter_buffer
+import cleanup
 
 client = TestClient(app)
 
@@ -24,3 +28,49 @@ def test_login():
     data = response.json()
     assert "access_token" in data
     assert data["token_type"] == "bearer"
+
+
+def test_login_token_carries_user_id_and_me_is_cached():
+    client.post("/signup", json={"username": "cacheduser", "email": "cached@example.com", "password": "cachedpass"})
+    token = client.post("/login", json={"email": "cached@example.com", "password": "cachedpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    me = client.get("/users/me", headers=headers).json()
+    assert jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["user_id"] == me["id"]
+    hits = principal_cache.hits
+    assert client.get("/users/me", headers=headers).json()["id"] == me["id"]
+    assert principal_cache.hits == hits + 1
+
+
+def test_delete_account_purges_content_and_fixes_counts():
+    client.post("/signup", json={"username": "leaver", "email": "leaver@example.com", "password": "leavepass"})
+    client.post("/signup", json={"username": "stayer", "email": "stayer@example.com", "password": "staypass"})
+    leaver = {"Authorization": "Bearer " + client.post("/login", json={"email": "leaver@example.com", "password": "leavepass"}).json()["access_token"]}
+    stayer = {"Authorization": "Bearer " + client.post("/login", json={"email": "stayer@example.com", "password": "staypass"}).json()["access_token"]}
+    kept = client.post("/posts", json={"content": "Stays"}, headers=stayer).json()["id"]
+    gone = client.post("/posts", json={"content": "Goes"}, headers=leaver).json()["id"]
+    client.post(f"/like?post_id={kept}", headers=leaver)
+    client.post(f"/comment?post_id={kept}&comment=bye", headers=leaver)
+    client.post(f"/comment?post_id={kept}&comment=hi", headers=stayer)
+
+    assert client.delete("/users/me", headers=leaver).status_code == 202
+    assert client.post("/posts", json={"content": "Still here?"}, headers=leaver).status_code == 401
+    cleanup.purger.join()
+    counter_buffer.flush()
+
+    assert client.get(f"/posts/{kept}/stats").json() == {"post_id": kept, "like_count": 0, "comment_count": 1}
+    assert [c["comment"] for c in client.get(f"/comments/{kept}").json()["items"]] == ["hi"]
+    assert client.get(f"/posts/{gone}").status_code == 404
+    assert client.post("/login", json={"email": "leaver@example.com", "password": "leavepass"}).status_code != 200
+
+
+def test_deleted_account_token_is_rejected():
+    client.post("/signup", json={"username": "revoked", "email": "revoked@example.com", "password": "revokepass"})
+    token = client.post("/login", json={"email": "revoked@example.com", "password": "revokepass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/feed", headers=headers).status_code == 200
+
+    assert client.delete("/users/me", headers=headers).status_code == 202
+    cleanup.purger.join()
+    assert client.post("/posts", json={"content": "Orphan"}, headers=headers).status_code == 401
+    assert client.get("/users/me", headers=headers).status_code == 401
@@ -0,0 +1,55 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+
+def create_user():
+    name = f"feeder_{uuid.uuid4().hex[:8]}"
+    client.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": "feedpass"})
+    token = client.post("/login", json={"email": f"{name}@example.com", "password": "feedpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    return headers, client.get("/users/me", headers=headers).json()["id"]
+
+
+def befriend(headers1, headers2, user2_id):
+    client.post(f"/friend-request?friend_id={user2_id}", headers=headers1)
+    request_id = client.get("/friend-requests", headers=headers2).json()[-1]["id"]
+    client.post(f"/accept-friend-request?request_id={request_id}", headers=headers2)
+
+
+def post(headers, content):
+    return client.post("/posts", json={"content": content}, headers=headers).json()["id"]
+
+
+def test_feed_merges_friends_posts_newest_first():
+    author, _ = create_user()
+    reader, reader_id = create_user()
+    stranger, _ = create_user()
+    befriend(author, reader, reader_id)
+
+    ids = [post(author, f"post {n}") for n in range(3)]
+    post(stranger, "not a friend")
+
+    page = client.get("/feed?limit=2", headers=reader).json()
+    assert [item["id"] for item in page["items"]] == ids[:0:-1]
+    page = client.get(f"/feed?limit=2&cursor={page['next_cursor']}", headers=reader).json()
+    assert [item["id"] for item in page["items"]] == ids[:1]
+    assert page["next_cursor"] is None
+
+    # Timeline is now cached: a new post is pushed into it
+    newest = post(author, "fresh")
+    assert client.get("/feed", headers=reader).json()["items"][0]["id"] == newest
+
+
+def test_unfriend_rebuilds_feed():
+    author, author_id = create_user()
+    reader, reader_id = create_user()
+    befriend(author, reader, reader_id)
+    post(author, "soon gone from the feed")
+    assert len(client.get("/feed", headers=reader).json()["items"]) == 1
+
+    client.delete(f"/friends/{author_id}", headers=reader)
+    assert client.get("/feed", headers=reader).json() == {"items": [], "next_cursor": None}
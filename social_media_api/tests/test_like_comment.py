@@ -1,6 +1,12 @@
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+from sqlalchemy import select, update
+
+import counters
+from counters import counter_buffer
+from database import engine
+from models import Post
 
 client = TestClient(app)
 
@@ -32,6 +38,23 @@ def test_like_post():
     assert response.json()["message"] == "Post liked"
 
 
+def test_like_post_twice_keeps_one_like():
+    token = client.post("/login", json={
+        "email": "likecomment@example.com",
+        "password": "likepass"
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    post_id = client.get("/posts", headers=headers).json()[0]["id"]
+
+    client.post(f"/like?post_id={post_id}", headers=headers)
+    response = client.post(f"/like?post_id={post_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["message"] == "Post liked"
+    likes = client.get(f"/likes/{post_id}").json()
+    assert len([like for like in likes if like["user_id"] == likes[0]["user_id"]]) == 1
+    assert client.post("/like?post_id=999999", headers=headers).status_code == 404
+
+
 def test_comment_post():
     token = get_token()
     post_id = client.get("/posts", headers={"Authorization": f"Bearer {token}"}).json()[0]["id"]
@@ -41,3 +64,85 @@ def test_comment_post():
     )
     assert response.status_code == 200
     assert response.json()["message"] == "Comment added"
+
+
+def test_post_stats_count_likes_and_comments():
+    client.post("/signup", json={"username": "counter", "email": "counter@example.com", "password": "countpass"})
+    token = client.post("/login", json={
+        "email": "counter@example.com",
+        "password": "countpass"
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    post_id = client.post("/posts", json={"content": "Counted"}, headers=headers).json()["id"]
+
+    client.post(f"/like?post_id={post_id}", headers=headers)
+    client.post(f"/like?post_id={post_id}", headers=headers)
+    comment_id = client.post(f"/comment?post_id={post_id}&comment=One", headers=headers).json()["id"]
+    client.post(f"/comment?post_id={post_id}&comment=Two", headers=headers)
+    client.delete(f"/comment/{comment_id}", headers=headers)
+    assert client.get(f"/posts/{post_id}/stats").json() == {"post_id": post_id, "like_count": 1, "comment_count": 1}
+
+    # Same numbers once the deltas reach the posts table
+    counter_buffer.flush()
+    assert counter_buffer.pending(post_id) == (0, 0)
+    assert client.get(f"/posts/{post_id}").json()["like_count"] == 1
+
+    client.delete(f"/like/{post_id}", headers=headers)
+    assert client.get(f"/posts/{post_id}/stats").json()["like_count"] == 0
+    counter_buffer.flush()
+    # Nothing drifted, so the recount has nothing to fix
+    assert counter_buffer.reconcile() == 0
+
+
+def test_reconcile_fixes_drift_but_not_unflushed_deltas(monkeypatch):
+    client.post("/signup", json={"username": "drifter", "email": "drifter@example.com", "password": "driftpass"})
+    token = client.post("/login", json={"email": "drifter@example.com", "password": "driftpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    drifted = client.post("/posts", json={"content": "Drifted"}, headers=headers).json()["id"]
+    busy = client.post("/posts", json={"content": "Busy"}, headers=headers).json()["id"]
+    client.post(f"/like?post_id={drifted}", headers=headers)
+    counter_buffer.flush()
+    with engine.begin() as connection:
+        connection.execute(update(Post).where(Post.id == drifted).values(like_count=7))
+
+    # A like whose delta is still buffered looks like drift until the flush lands mid-reconcile
+    client.post(f"/like?post_id={busy}", headers=headers)
+    monkeypatch.setattr(counters.time, "sleep", lambda seconds: counter_buffer.flush())
+    assert counter_buffer.reconcile() == 1
+    with engine.connect() as connection:
+        stored = connection.execute(select(Post.like_count).where(Post.id.in_([drifted, busy]))).scalars().all()
+    assert stored == [1, 1]
+
+
+def test_comments_cursor_pagination():
+    client.post("/signup", json={"username": "pager", "email": "pager@example.com", "password": "pagerpass"})
+    token = client.post("/login", json={
+        "email": "pager@example.com",
+        "password": "pagerpass"
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    post_id = client.post("/posts", json={"content": "Paged"}, headers=headers).json()["id"]
+    ids = [
+        client.post(f"/comment?post_id={post_id}&comment=c{i}", headers=headers).json()["id"]
+        for i in range(5)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        url = f"/comments/{post_id}?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).json()
+        seen += [comment["id"] for comment in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+    page = client.get(f"/comments/{post_id}?order=oldest&limit=3").json()
+    assert [comment["id"] for comment in page["items"]] == ids[:3]
+    page = client.get(f"/comments/{post_id}?order=oldest&limit=3&cursor={page['next_cursor']}").json()
+    assert [comment["id"] for comment in page["items"]] == ids[3:]
+    assert page["next_cursor"] is None
+    assert page["items"][0]["created_at"] is not None
+
+    assert client.get(f"/comments/{post_id}?limit=1000").status_code == 422
+    assert client.get(f"/comments/{post_id}?cursor={10 ** 25}").status_code == 422
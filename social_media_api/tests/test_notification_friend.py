@@ -1,6 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 from main import app
+from notifications import notification_writer, notify
 
 client = TestClient(app)
 
@@ -18,7 +20,7 @@ def test_notification():
 
     response = client.get("/notifications", headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
 
 
 def test_friendship():
@@ -36,3 +38,108 @@ def test_friendship():
     response = client.post(f"/accept-friend-request?request_id={request_id}", headers={"Authorization": f"Bearer {token2}"})
     assert response.status_code == 200
     assert response.json()["message"] == "Friend request accepted"
+
+
+def test_friend_request_is_pushed_over_websocket_and_stored():
+    token1 = create_user("pusher", "pusher@example.com", "push123")
+    token2 = create_user("listener", "listener@example.com", "listen123")
+    user2_id = client.get("/users/me", headers={"Authorization": f"Bearer {token2}"}).json()["id"]
+
+    with client.websocket_connect(f"/ws/notifications?token={token2}") as websocket:
+        client.post(f"/friend-request?friend_id={user2_id}", headers={"Authorization": f"Bearer {token1}"})
+        event = websocket.receive_json()
+    assert event["type"] == "friend_request"
+    assert event["message"] == "pusher sent you a friend request"
+
+    notification_writer.flush()
+    messages = [n["message"] for n in client.get("/notifications", headers={"Authorization": f"Bearer {token2}"}).json()["items"]]
+    assert "pusher sent you a friend request" in messages
+
+
+def test_websocket_rejects_bad_token():
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws/notifications?token=not-a-token") as websocket:
+            websocket.receive_json()
+
+
+def test_bulk_mark_read_and_delete_keep_unread_count():
+    token = create_user("bulkreader", "bulkreader@example.com", "bulk123")
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    for n in range(5):
+        notify(user_id, "test", f"note {n}")
+    assert client.get("/notifications/unread-count", headers=headers).json() == {"unread": 5}
+    notification_writer.flush()
+
+    page = client.get("/notifications?limit=2", headers=headers).json()
+    assert [n["message"] for n in page["items"]] == ["note 4", "note 3"]
+    ids = [n["id"] for n in page["items"]]
+
+    assert client.post("/notifications/read", json={"ids": ids}, headers=headers).json() == {"updated": 2}
+    assert client.post("/notifications/read", json={"ids": ids}, headers=headers).json() == {"updated": 0}
+    unread = client.get("/notifications?unread_only=true", headers=headers).json()["items"]
+    assert [n["message"] for n in unread] == ["note 2", "note 1", "note 0"]
+
+    # Everything older than note 1: deletes one unread notification
+    response = client.post("/notifications/delete", json={"before_id": unread[1]["id"]}, headers=headers)
+    assert response.json() == {"deleted": 1}
+    assert client.get("/notifications/unread-count", headers=headers).json() == {"unread": 2}
+    assert client.post("/notifications/read", json={"before_id": ids[0] + 1}, headers=headers).json() == {"updated": 2}
+    assert client.get("/notifications/unread-count", headers=headers).json() == {"unread": 0}
+
+    assert client.post("/notifications/read", json={}, headers=headers).status_code == 422
+    assert client.post("/notifications/read", json={"before_id": 10 ** 25}, headers=headers).status_code == 422
+    assert client.post("/notifications/read", json={"ids": list(range(1, 40001))}, headers=headers).status_code == 422
+
+
+def test_friends_mutuals_and_suggestions():
+    users = {}
+    for name in "abcde":
+        token = create_user(f"graph_{name}", f"graph_{name}@example.com", "graph123")
+        headers = {"Authorization": f"Bearer {token}"}
+        users[name] = (headers, client.get("/users/me", headers=headers).json()["id"])
+    for left, right in ["ab", "ac", "bd", "cd", "ce"]:
+        client.post(f"/friend-request?friend_id={users[right][1]}", headers=users[left][0])
+        request_id = client.get("/friend-requests", headers=users[right][0]).json()[-1]["id"]
+        client.post(f"/accept-friend-request?request_id={request_id}", headers=users[right][0])
+
+    a_headers = users["a"][0]
+    assert client.get("/friends", headers=a_headers).json() == sorted([users["b"][1], users["c"][1]])
+    assert client.get(f"/friends/{users['d'][1]}/mutual", headers=a_headers).json()["mutual_friends"] == 2
+    assert client.get("/friends/suggestions", headers=a_headers).json() == [
+        {"user_id": users["d"][1], "mutual_friends": 2},
+        {"user_id": users["e"][1], "mutual_friends": 1},
+    ]
+
+    client.delete(f"/friends/{users['b'][1]}", headers=a_headers)
+    assert client.get("/friends", headers=a_headers).json() == [users["c"][1]]
+    assert client.get("/friends/suggestions", headers=a_headers).json() == [
+        {"user_id": users["d"][1], "mutual_friends": 1},
+        {"user_id": users["e"][1], "mutual_friends": 1},
+    ]
+
+
+def test_friendship_pair_is_stored_once():
+    token1 = create_user("pair_one", "pair_one@example.com", "pair123")
+    token2 = create_user("pair_two", "pair_two@example.com", "pair123")
+    headers1, headers2 = {"Authorization": f"Bearer {token1}"}, {"Authorization": f"Bearer {token2}"}
+    user1_id = client.get("/users/me", headers=headers1).json()["id"]
+    user2_id = client.get("/users/me", headers=headers2).json()["id"]
+
+    assert client.post(f"/friend-request?friend_id={user1_id}", headers=headers2).status_code == 200
+    # Neither a repeat nor the mirrored request creates a second row
+    assert client.post(f"/friend-request?friend_id={user1_id}", headers=headers2).status_code == 400
+    assert client.post(f"/friend-request?friend_id={user2_id}", headers=headers1).status_code == 400
+    assert client.post("/friend-request?friend_id=999999", headers=headers1).status_code == 404
+    assert client.get(f"/friends/{user2_id}/status", headers=headers1).json() == {
+        "user_id": user2_id, "status": "pending", "requester_id": user2_id,
+    }
+
+    request_id = client.get("/friend-requests", headers=headers1).json()[-1]["id"]
+    assert client.get("/friend-requests", headers=headers2).json() == []
+    assert client.post(f"/accept-friend-request?request_id={request_id}", headers=headers2).status_code == 403
+    client.post(f"/accept-friend-request?request_id={request_id}", headers=headers1)
+    assert client.get(f"/friends/{user1_id}/status", headers=headers2).json()["status"] == "accepted"
+
+    client.delete(f"/friends/{user2_id}", headers=headers1)
+    assert client.get(f"/friends/{user1_id}/status", headers=headers2).json()["status"] is None
@@ -1,6 +1,12 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+from database import AsyncSessionLocal, async_engine
+import cleanup
+import posts
+from sqlalchemy import event
 
 client = TestClient(app)
 
@@ -33,3 +39,136 @@ def test_get_posts():
     response = client.get("/posts", headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+
+def test_post_cache_coalesces_cold_loads_and_invalidates_on_update():
+    client.post("/signup", json={"username": "cacher", "email": "cacher@example.com", "password": "cachepass"})
+    token = client.post("/login", json={"email": "cacher@example.com", "password": "cachepass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    post_id = client.post("/posts", json={"content": "Cached"}, headers=headers).json()["id"]
+    posts.invalidate_post(post_id)
+
+    async def read_all():
+        async with AsyncSessionLocal() as session:
+            results = await asyncio.gather(*[posts.get_cached_post(session, post_id) for _ in range(50)])
+        await async_engine.dispose()
+        return results
+
+    coalesced = posts.post_loads.coalesced
+    results = asyncio.run(read_all())
+    assert {result["content"] for result in results} == {"Cached"}
+    assert posts.post_loads.coalesced - coalesced == 49
+
+    hits = posts.post_cache.hits
+    assert client.get(f"/posts/{post_id}").json()["content"] == "Cached"
+    assert posts.post_cache.hits == hits + 1
+
+    client.put(f"/posts/{post_id}", json={"content": "Edited"}, headers=headers)
+    assert client.get(f"/posts/{post_id}").json()["content"] == "Edited"
+    client.delete(f"/posts/{post_id}", headers=headers)
+    assert client.get(f"/posts/{post_id}").status_code == 404
+
+    stats = client.get("/posts/cache-stats").json()
+    assert stats["approx_bytes"] >= 0 and "hit_ratio" in stats
+
+
+def test_single_flight_survives_a_cancelled_leader():
+    async def scenario():
+        flight = posts.SingleFlight()
+        started = asyncio.Event()
+        loads = []
+
+        async def load():
+            loads.append(1)
+            started.set()
+            await asyncio.sleep(0.05)
+            return len(loads)
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await started.wait()
+        waiters = [asyncio.create_task(flight.do("key", load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        return leader, await asyncio.gather(*waiters)
+
+    leader, results = asyncio.run(scenario())
+    # One waiter reloads in place of the cancelled leader; the others share its result
+    assert leader.cancelled() and results == [2, 2, 2]
+
+
+def test_multi_get_embeds_aggregates_in_fixed_queries():
+    client.post("/signup", json={"username": "multigetter", "email": "multigetter@example.com", "password": "multipass"})
+    token = client.post("/login", json={"email": "multigetter@example.com", "password": "multipass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    post_ids = [client.post("/posts", json={"content": f"Post {n}"}, headers=headers).json()["id"] for n in range(6)]
+    for post_id in post_ids[:3]:
+        client.post(f"/like?post_id={post_id}", headers=headers)
+    for n in range(5):
+        client.post(f"/comment?post_id={post_ids[0]}&comment=c{n}", headers=headers)
+
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    include = "like_count,comment_count,recent_comments"
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        small = client.get(f"/posts?ids={post_ids[1]},{post_ids[0]}&include={include}", headers=headers).json()
+        queries_small = len(statements)
+        statements.clear()
+        large = client.get(f"/posts?ids={','.join(map(str, post_ids))},999999&include={include}", headers=headers).json()
+        queries_large = len(statements)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert queries_small == queries_large <= 3
+    assert [item["id"] for item in small] == [post_ids[1], post_ids[0]]
+    assert small[1]["like_count"] == 1 and small[1]["comment_count"] == 5
+    assert [c["comment"] for c in small[1]["recent_comments"]] == ["c4", "c3", "c2"]
+    assert [item["id"] for item in large] == post_ids
+    assert large[5] == {**large[5], "like_count": 0, "comment_count": 0, "recent_comments": []}
+
+    assert client.get(f"/posts?ids={post_ids[0]}&include=everything", headers=headers).status_code == 400
+    assert client.get(f"/posts?ids={post_ids[0]},{2 ** 63}", headers=headers).status_code == 400
+    assert client.get("/posts?ids=10000000000000000000000000", headers=headers).status_code == 422
+
+
+def test_delete_post_removes_likes_and_comments(monkeypatch):
+    client.post("/signup", json={"username": "deleter", "email": "deleter@example.com", "password": "deletepass"})
+    token = client.post("/login", json={"email": "deleter@example.com", "password": "deletepass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def populated_post():
+        post_id = client.post("/posts", json={"content": "Doomed"}, headers=headers).json()["id"]
+        client.post(f"/like?post_id={post_id}", headers=headers)
+        for n in range(5):
+            client.post(f"/comment?post_id={post_id}&comment=c{n}", headers=headers)
+        return post_id
+
+    post_id = populated_post()
+    assert client.delete(f"/posts/{post_id}", headers=headers).status_code == 200
+    assert client.get(f"/likes/{post_id}").json() == []
+    assert client.get(f"/comments/{post_id}").json()["items"] == []
+
+    # Past the inline limit the purge runs in the background, a few rows per transaction
+    monkeypatch.setattr(cleanup, "INLINE_PURGE_LIMIT", 0)
+    monkeypatch.setattr(cleanup.purger, "chunk", 2)
+    post_id = populated_post()
+    assert client.delete(f"/posts/{post_id}", headers=headers).status_code == 202
+    cleanup.purger.join()
+    assert client.get(f"/posts/{post_id}").status_code == 404
+    assert client.get(f"/likes/{post_id}").json() == []
+    assert client.get(f"/comments/{post_id}").json()["items"] == []
+
+
+def test_feed_reports_sql_timing_per_request():
+    client.post("/signup", json={"username": "timed", "email": "timed@example.com", "password": "timedpass"})
+    token = client.post("/login", json={"email": "timed@example.com", "password": "timedpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/posts", json={"content": "Timed"}, headers=headers)
+
+    first = client.get("/feed", headers=headers).headers["server-timing"]
+    assert first.startswith("db;dur=") and 'queries"' in first
+    # Served from the materialized timeline: fewer statements than the build
+    second = client.get("/feed", headers=headers).headers["server-timing"]
+    count = lambda timing: int(timing.split('desc="')[1].split(" ")[0])
+    assert count(second) <= count(first)
+
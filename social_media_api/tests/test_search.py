@@ -0,0 +1,44 @@
+import base64
+import uuid
+
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+
+def test_search_ranks_pages_and_follows_edits_and_deletes():
+    name = uuid.uuid4().hex[:8]
+    client.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": "searchpass"})
+    token = client.post("/login", json={"email": f"{name}@example.com", "password": "searchpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    word = f"zq{name}"
+    best = client.post("/posts", json={"content": f"{word} {word} {word}"}, headers=headers).json()["id"]
+    others = [
+        client.post("/posts", json={"content": f"One mention of {word} in a longer post number {n}"}, headers=headers).json()["id"]
+        for n in range(4)
+    ]
+    client.post("/posts", json={"content": "Unrelated"}, headers=headers)
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/search/posts", params={"q": word.upper(), "limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        seen += [post["id"] for post in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen[0] == best
+    assert sorted(seen[1:]) == others
+
+    client.put(f"/posts/{others[0]}", json={"content": f"Edited away {name}"}, headers=headers)
+    client.delete(f"/posts/{others[1]}", headers=headers)
+    ids = [post["id"] for post in client.get("/search/posts", params={"q": word}).json()["items"]]
+    assert ids == [best, others[2], others[3]]
+    assert [post["id"] for post in client.get("/search/posts", params={"q": f"edited {name}"}).json()["items"]] == [others[0]]
+
+    # Query syntax in user input is treated as plain words
+    assert client.get("/search/posts", params={"q": f'{word} OR "NEAR(*'}).status_code == 200
+    assert client.get("/search/posts", params={"q": word, "cursor": "bogus"}).status_code == 400
+    for key in ('{"score": 1.0, "id": 10000000000000000000000000}', '{"score": NaN, "id": 1}', '{"score": 1e999, "id": 1}', "[1]"):
+        cursor = base64.urlsafe_b64encode(key.encode()).decode()
+        assert client.get("/search/posts", params={"q": word, "cursor": cursor}).status_code == 400
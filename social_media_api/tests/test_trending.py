@@ -0,0 +1,48 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from main import app
+from trending import SlidingTopK, hashtags
+
+client = TestClient(app)
+
+
+def test_hashtags_are_parsed_once_lower_cased():
+    assert hashtags("New #FastAPI release! #python #fastapi, not an#anchor") == ["fastapi", "python"]
+
+
+def test_sliding_top_k_keeps_heavy_hitters_and_forgets_old_buckets():
+    counter = SlidingTopK(window=60, bucket=10, capacity=3)
+    for key, count in [("a", 5), ("b", 3), ("c", 2), ("d", 1)]:
+        counter.add(key, count, now=0)
+    assert counter.top(3, now=0) == [("a", 5), ("b", 3), ("c", 2)]
+
+    # A new key only displaces the weakest candidate once it scores higher
+    counter.add("e", 4, now=15)
+    assert counter.top(2, now=15) == [("a", 5), ("e", 4)]
+    assert "c" not in dict(counter.top(3, now=15))
+
+    # Sixty seconds on, the first bucket has slid out of the window
+    assert counter.top(3, now=65) == [("e", 4)]
+    assert counter.top(3, now=200) == []
+
+
+def test_trending_endpoint_reflects_likes_comments_and_hashtags():
+    name = uuid.uuid4().hex[:8]
+    client.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": "trendpass"})
+    token = client.post("/login", json={"email": f"{name}@example.com", "password": "trendpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    tag = f"tag{name}"
+    hot = client.post("/posts", json={"content": f"Hot #{tag}"}, headers=headers).json()["id"]
+    client.post("/posts", json={"content": f"Also #{tag.upper()}"}, headers=headers)
+    client.post(f"/like?post_id={hot}", headers=headers)
+    for n in range(20):
+        client.post(f"/comment?post_id={hot}&comment=c{n}", headers=headers)
+
+    trending = client.get("/trending?limit=5").json()
+    # Estimates never undercount (SQLite may also hand out the id of a deleted post again)
+    assert trending["posts"][0]["post_id"] == hot and trending["posts"][0]["score"] >= 41
+    assert {"tag": tag, "count": 2} in trending["hashtags"]
+
+    client.delete(f"/posts/{hot}", headers=headers)
+    assert hot not in [item["post_id"] for item in client.get("/trending").json()["posts"]]
@@ -0,0 +1,167 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from friend_graph import friend_graph
+from models import Post
+
+# Home feed, fan-out on write.
+#
+# Every active reader has a bounded timeline of post ids (newest first). create_post
+# pushes the new id into the timelines of the author's friends that are already
+# materialized; the rest are built from the posts table on their next read.
+# Authors with more than FANOUT_LIMIT friends are not pushed at all: their posts
+# are pulled and merged in when a friend reads the feed (fan-out on read).
+
+TIMELINE_LENGTH = 800
+FANOUT_LIMIT = 1000
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 100
+
+
+@dataclass
+class Timeline:
+    post_ids: Deque[int]
+    push_authors: Tuple[int, ...]
+    pull_authors: Tuple[int, ...]
+    # False once older ids have been trimmed off; reads past the end then go to the database
+    complete: bool = True
+
+
+class TimelineStore(ABC):
+    """Where materialized timelines live. Subclass it to move them out of process
+    (e.g. a Redis list per user with LPUSH + LTRIM); methods map onto those calls."""
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[Timeline]:
+        """The user's materialized timeline, or None if there isn't one."""
+
+    @abstractmethod
+    def set(self, user_id: int, timeline: Timeline):
+        """Store a freshly built timeline."""
+
+    @abstractmethod
+    def push(self, user_ids: Iterable[int], post_id: int):
+        """Prepend post_id to each materialized timeline in user_ids; others are skipped."""
+
+    @abstractmethod
+    def invalidate(self, user_ids: Iterable[int]):
+        """Drop these users' timelines so the next read rebuilds them."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryTimelineStore(TimelineStore):
+    """Per-process store: an LRU of timelines that also expire after `ttl`, which
+    bounds how stale a timeline can get on workers that missed a push."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id: int) -> Optional[Timeline]:
+        return self._cache.get(user_id)
+
+    def set(self, user_id: int, timeline: Timeline):
+        self._cache.set(user_id, timeline)
+
+    def push(self, user_ids: Iterable[int], post_id: int):
+        for user_id in user_ids:
+            timeline = self._cache.get(user_id)
+            if timeline is None:
+                continue
+            if len(timeline.post_ids) == timeline.post_ids.maxlen:
+                timeline.complete = False
+            timeline.post_ids.appendleft(post_id)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        for user_id in user_ids:
+            self._cache.delete(user_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+timeline_store: TimelineStore = InMemoryTimelineStore()
+
+
+async def friend_ids(db: AsyncSession, user_id: int) -> List[int]:
+    return list(await friend_graph.neighbors(db, user_id))
+
+
+async def friend_counts(db: AsyncSession, user_ids: List[int]) -> dict:
+    lists = await friend_graph.neighbors_many(db, user_ids)
+    return {user_id: len(friends) for user_id, friends in lists.items()}
+
+
+async def _recent_post_ids(db: AsyncSession, author_ids, before: Optional[int], limit: int) -> List[int]:
+    if not author_ids:
+        return []
+    query = select(Post.id).filter(Post.user_id.in_(author_ids))
+    if before is not None:
+        query = query.filter(Post.id < before)
+    result = await db.execute(query.order_by(Post.id.desc()).limit(limit))
+    return list(result.scalars())
+
+
+async def build_timeline(db: AsyncSession, user_id: int) -> Timeline:
+    friends = await friend_ids(db, user_id)
+    counts = await friend_counts(db, friends)
+    pull = tuple(friend for friend in friends if counts.get(friend, 0) > FANOUT_LIMIT)
+    push = tuple(friend for friend in friends if counts.get(friend, 0) <= FANOUT_LIMIT)
+    post_ids = await _recent_post_ids(db, push, None, TIMELINE_LENGTH)
+    return Timeline(deque(post_ids, maxlen=TIMELINE_LENGTH), push, pull, complete=len(post_ids) < TIMELINE_LENGTH)
+
+
+async def fan_out_post(db: AsyncSession, post: Post):
+    friends = await friend_ids(db, post.user_id)
+    if len(friends) <= FANOUT_LIMIT:
+        timeline_store.push(friends, post.id)
+
+
+async def friendship_changed(db: AsyncSession, *user_ids: int):
+    """Drop the timelines a friendship change affects; they are rebuilt on next read.
+
+    Besides the two users, if either just crossed FANOUT_LIMIT its friends switch
+    between push and pull for that author, so their timelines are dropped too.
+    """
+    timeline_store.invalidate(user_ids)
+    counts = await friend_counts(db, list(user_ids))
+    for user_id in user_ids:
+        if counts.get(user_id, 0) in (FANOUT_LIMIT, FANOUT_LIMIT + 1):
+            timeline_store.invalidate(await friend_ids(db, user_id))
+
+
+async def get_feed(db: AsyncSession, user_id: int, before: Optional[int] = None, limit: int = FEED_PAGE_SIZE):
+    """Posts from accepted friends, newest first, strictly older than post id `before`.
+
+    Returns (posts, next_cursor); pass next_cursor back as `before` for the next page.
+    """
+    timeline = timeline_store.get(user_id)
+    if timeline is None:
+        timeline = await build_timeline(db, user_id)
+        timeline_store.set(user_id, timeline)
+
+    want = limit + 1
+    ids = [post_id for post_id in list(timeline.post_ids) if before is None or post_id < before][:want]
+    if len(ids) < want and not timeline.complete:
+        # Paged past the cached window: read the rest of the push authors' posts directly
+        oldest = timeline.post_ids[-1] if timeline.post_ids else None
+        if before is not None and (oldest is None or before < oldest):
+            oldest = before
+        ids += await _recent_post_ids(db, timeline.push_authors, oldest, want - len(ids))
+    ids += await _recent_post_ids(db, timeline.pull_authors, before, want)
+    ids = sorted(set(ids), reverse=True)[:want]
+
+    next_cursor = ids[limit - 1] if len(ids) > limit else None
+    ids = ids[:limit]
+    if not ids:
+        return [], next_cursor
+    # Posts deleted since they were pushed simply drop out here
+    result = await db.execute(select(Post).filter(Post.id.in_(ids)).order_by(Post.id.desc()))
+    return result.scalars().all(), next_cursor
@@ -0,0 +1,163 @@
+import heapq
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Iterable, List, Tuple
+
+# Trending posts and hashtags over a sliding window, without reading the likes table.
+#
+# Activity is counted per time bucket in count-min sketches, and a window sketch
+# holds the sum of the live buckets: an event adds to both, and an expiring bucket
+# is subtracted from the window, so estimates cover the last TRENDING_WINDOW_SECONDS
+# in BUCKET_SECONDS steps. The keys currently scoring highest are kept as a bounded
+# candidate set, and GET /trending reads only that set. Memory is fixed by the
+# sketch size and candidate capacity whatever the traffic. Counts are per process
+# and approximate: a key's estimate never undercounts, and can overcount by about
+# e / SKETCH_WIDTH of all activity in the window.
+
+TRENDING_WINDOW_SECONDS = int(os.getenv("TRENDING_WINDOW_SECONDS", "3600"))
+BUCKET_SECONDS = int(os.getenv("TRENDING_BUCKET_SECONDS", "60"))
+SKETCH_WIDTH = 1024
+SKETCH_DEPTH = 4
+TOP_K = 50
+# Candidates tracked per counter; more than TOP_K so keys near the cut-off don't flap out
+CANDIDATES = 4 * TOP_K
+
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 2
+
+HASHTAG = re.compile(r"(?<!\w)#(\w{1,50})")
+
+
+def hashtags(content: str) -> List[str]:
+    """Distinct lower-cased hashtags in `content`, in order of appearance."""
+    return list(dict.fromkeys(tag.lower() for tag in HASHTAG.findall(content or "")))
+
+
+class CountMinSketch:
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("q", bytes(8 * width)) for _ in range(depth)]
+
+    def _cells(self, key):
+        return [hash((seed, key)) % self.width for seed in range(self.depth)]
+
+    def add(self, key, count: int = 1, cells=None):
+        for row, cell in zip(self.rows, cells or self._cells(key)):
+            row[cell] += count
+
+    def estimate(self, key, cells=None) -> int:
+        return min(row[cell] for row, cell in zip(self.rows, cells or self._cells(key)))
+
+    def subtract(self, other: "CountMinSketch"):
+        for row, other_row in zip(self.rows, other.rows):
+            for cell, count in enumerate(other_row):
+                if count:
+                    row[cell] -= count
+
+    def clear(self):
+        for row in self.rows:
+            row[:] = array("q", bytes(8 * self.width))
+
+
+class SlidingTopK:
+    """Approximate heavy hitters of the last `window` seconds."""
+
+    def __init__(self, window: int = TRENDING_WINDOW_SECONDS, bucket: int = BUCKET_SECONDS,
+                 capacity: int = CANDIDATES, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.bucket = bucket
+        self.buckets = [CountMinSketch(width, depth) for _ in range(max(1, window // bucket))]
+        self.window = CountMinSketch(width, depth)
+        self.capacity = capacity
+        self._epoch = None
+        self._lock = threading.Lock()
+        # key -> window estimate, plus a min-heap over it with lazily dropped stale entries
+        self._candidates = {}
+        self._heap = []
+
+    def _rotate(self, now: float):
+        epoch = int(now // self.bucket)
+        if self._epoch is None:
+            self._epoch = epoch
+        expired = min(epoch - self._epoch, len(self.buckets))
+        if expired <= 0:
+            return
+        if expired == len(self.buckets):
+            for sketch in self.buckets:
+                sketch.clear()
+            self.window.clear()
+        else:
+            for step in range(1, expired + 1):
+                sketch = self.buckets[(self._epoch + step) % len(self.buckets)]
+                self.window.subtract(sketch)
+                sketch.clear()
+        self._epoch = epoch
+        # Counts only went down: re-estimate the candidates and forget the ones at zero
+        self._candidates = {key: self.window.estimate(key) for key in self._candidates}
+        self._candidates = {key: count for key, count in self._candidates.items() if count > 0}
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self._candidates.items()]
+        heapq.heapify(self._heap)
+
+    def _smallest(self) -> Tuple[int, object]:
+        while True:
+            count, key = self._heap[0]
+            if self._candidates.get(key) == count:
+                return count, key
+            heapq.heappop(self._heap)
+
+    def add(self, key, count: int = 1, now: float = None):
+        with self._lock:
+            self._rotate(time.monotonic() if now is None else now)
+            cells = self.window._cells(key)
+            self.buckets[self._epoch % len(self.buckets)].add(key, count, cells)
+            self.window.add(key, count, cells)
+            estimate = self.window.estimate(key, cells)
+            if key not in self._candidates and len(self._candidates) >= self.capacity:
+                smallest, evicted = self._smallest()
+                if estimate <= smallest:
+                    return
+                heapq.heappop(self._heap)
+                del self._candidates[evicted]
+            self._candidates[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+            if len(self._heap) > 4 * self.capacity:
+                self._rebuild_heap()
+
+    def discard(self, key):
+        """Stop reporting `key`, e.g. a deleted post; it comes back only with new activity."""
+        with self._lock:
+            self._candidates.pop(key, None)
+
+    def top(self, k: int = TOP_K, now: float = None) -> List[Tuple[object, int]]:
+        """Up to `k` (key, estimated count) pairs, highest first."""
+        with self._lock:
+            self._rotate(time.monotonic() if now is None else now)
+            return heapq.nlargest(k, self._candidates.items(), key=lambda item: (item[1], item[0]))
+
+
+post_activity = SlidingTopK()
+hashtag_activity = SlidingTopK()
+
+
+def record_post(content: str):
+    for tag in hashtags(content):
+        hashtag_activity.add(tag)
+
+
+def record_like(post_id: int):
+    post_activity.add(post_id, LIKE_WEIGHT)
+
+
+def record_comment(post_id: int):
+    post_activity.add(post_id, COMMENT_WEIGHT)
+
+
+def forget_posts(post_ids: Iterable[int]):
+    for post_id in post_ids:
+        post_activity.discard(post_id)
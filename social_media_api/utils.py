@@ -1,9 +1,7 @@
-from passlib.context import CryptContext
+from passwords import pwd_context
 from datetime import datetime, timedelta
 from jose import jwt
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30